@@ -0,0 +1,239 @@
+'''
+Offline self-play training of the auction bid policy.
+
+Each simulated auction deals a fresh round from a random preflop pot straight to
+the flop auction and plays it on engine.RoundState: both bids go through
+proceed, so the real second-price resolution and card dealing apply, and the
+hand is then checked down to showdown. For each player and each candidate bid
+in auction_policy.ARMS the payoff is measured on the same deal against the
+opponent's bid from an earlier policy. Workers return least squares sufficient
+statistics, so millions of auctions reduce to a few small matrices. Every
+iteration fits per-arm payoff models against a uniform mix of all earlier
+policies, starting from the bot's hand-tuned rule (fictitious play), since
+answering only the latest policy makes the bids escalate from one iteration to
+the next.
+
+The fitted policy is written to main/auction_policy.npz, which the bot loads at
+startup. Postflop betting is not simulated, so payoffs are showdown equity in
+the pot minus what the auction costs.
+
+Usage: python3 auction_selfplay.py [--auctions N] [--iterations K] [--workers W]
+'''
+from multiprocessing import Pool
+import argparse
+import os
+import sys
+import time
+
+import eval7
+import numpy as np
+
+from engine import RoundState, TerminalState, BidAction, STARTING_STACK
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main'))
+import batch_eval  # noqa: E402
+from auction_table import AuctionTable  # noqa: E402
+from auction_policy import AuctionPolicy, ARMS, NUM_FEATURES, POLICY_PATH, policy_features  # noqa: E402
+
+EQUITY_TRIALS = 256  # monte carlo trials per auction equity when no auction table is built
+PREFLOP_CONTRIBUTIONS = [2, 2, 2, 4, 6, 8, 12, 20, 40, 80]  # chips each player has in when the flop comes
+RIDGE = 1e-3  # regularization of the per-arm least squares fits
+CHUNK = 2000  # auctions per worker job
+BLOCK = 250  # auctions whose equities are simulated in one batch
+
+_table = None
+
+
+def sample_distinct(decks, trials, count, rng):
+    '''
+    decks (array): (n, k) card codes still available in each auction
+    trials (int): draws per auction
+    count (int): cards per draw
+
+    Returns (n, trials, count) draws without replacement from each auction's deck
+    '''
+    positions = rng.integers(decks.shape[1], size=(len(decks), trials, count))
+    while True:
+        ordered = np.sort(positions, axis=2)
+        clash = (ordered[:, :, 1:] == ordered[:, :, :-1]).any(axis=2)
+        if not clash.any():
+            break
+        positions[clash] = rng.integers(decks.shape[1], size=(clash.sum(), count))
+    return np.take_along_axis(decks[:, None, :], positions, axis=2)
+
+
+def equities(hands, flops, rng, trials=EQUITY_TRIALS):
+    '''
+    hands (array): (n, 2) hole card codes
+    flops (array): (n, 3) flop card codes
+
+    Returns (n, 3) tie, win and lose probabilities as Player.auction_estimate computes them
+    '''
+    result = np.empty((len(hands), 3))
+    missing = np.ones(len(hands), dtype=bool)
+    if _table is not None:
+        for i in range(len(hands)):
+            found = _table.lookup(batch_eval.decode(hands[i]), batch_eval.decode(flops[i]))
+            if found is not None:
+                result[i], missing[i] = found, False
+    if not missing.any():
+        return result
+    hands, flops = hands[missing], flops[missing]
+    dead = np.zeros((len(hands), 52), dtype=bool)
+    np.put_along_axis(dead, np.hstack([hands, flops]).astype(np.intp), True, axis=1)
+    decks = np.nonzero(~dead)[1].reshape(len(hands), 47).astype(np.uint8)
+    drawn = sample_distinct(decks, trials, 5, rng)
+    mine = np.broadcast_to(np.hstack([hands, flops])[:, None, :], (len(hands), trials, 5))
+    board = np.broadcast_to(flops[:, None, :], (len(hands), trials, 3))
+    unflipped, auction, opp_cards = drawn[:, :, 0:2], drawn[:, :, 2:3], drawn[:, :, 3:5]
+
+    def value(*parts):
+        cards = np.concatenate(parts, axis=2)
+        return batch_eval.evaluate(cards.reshape(-1, cards.shape[2])).reshape(len(hands), trials)
+
+    val2, val3 = value(mine, unflipped), value(mine, unflipped, auction)
+    opp2, opp3 = value(board, unflipped, opp_cards), value(board, unflipped, opp_cards, auction)
+    # same outcomes as auction_table.auction_trials
+    result[missing] = np.stack([(val2 > opp2).mean(axis=1), (val3 > opp2).mean(axis=1), (val2 > opp3).mean(axis=1)], axis=1)
+    return result
+
+
+def heuristic_bid(p_tie, p_win, p_lose, max_bid):
+    '''
+    The bot's hand-tuned bid, used as the opponent before any policy is fitted.
+    '''
+    if p_tie < 0.35:
+        return 0
+    if p_tie > 0.65:
+        return max_bid
+    return max(min(int((0.5 + p_win - p_lose)*max_bid), max_bid), 0)
+
+
+def max_bid(stacks, player):
+    '''
+    Returns the most a player would bid, the same cap as the bot uses.
+    '''
+    return stacks[1-player] + 1 if stacks[player] > stacks[1-player] else stacks[player]
+
+
+def play_out(state, bids):
+    '''
+    state (RoundState): the flop state awaiting bids, button 1 bids first
+    bids (list): each player's bid
+
+    Returns the TerminalState after resolving the auction and checking down to showdown
+    '''
+    state = state.proceed(BidAction(bids[1]))
+    state = state.proceed(BidAction(bids[0]))
+    while not isinstance(state, TerminalState):  # both players check every street
+        state = state.proceed_street()
+    return state
+
+
+def simulate(job):
+    '''
+    job (tuple): (weights of each opponent policy, None for the hand-tuned rule, number of auctions, seed)
+
+    Returns (X^T X, X^T Y, count) where rows are a player's features and Y their payoff per arm in pots
+    '''
+    opponents, auctions, seed = job
+    rng = np.random.default_rng(seed)
+    policies = [AuctionPolicy(weights) if weights is not None else None for weights in opponents]
+    xtx = np.zeros((NUM_FEATURES, NUM_FEATURES))
+    xty = np.zeros((NUM_FEATURES, len(ARMS)))
+    deck_cards = eval7.Deck().cards
+    for block in range(0, auctions, BLOCK):
+        size = min(BLOCK, auctions - block)
+        orders = rng.random((size, 52)).argsort(axis=1)  # deal order of each auction's deck
+        # eval7's deck lists cards in the same order as batch_eval codes
+        codes = orders.astype(np.uint8)
+        block_equities = [equities(codes[:, 2*player:2*player + 2], codes[:, 4:7], rng) for player in range(2)]
+        for i in range(size):
+            deck = eval7.Deck()
+            deck.cards = [deck_cards[j] for j in orders[i]]
+            hands = [deck.deal(2), deck.deal(2)]
+            contribution = PREFLOP_CONTRIBUTIONS[rng.integers(len(PREFLOP_CONTRIBUTIONS))]
+            stacks = [STARTING_STACK - contribution]*2
+            pot = 2*contribution
+            state = RoundState(1, 3, True, [None, None], [0, 0], stacks, hands, deck, None)
+            features, bids = [], []
+            for player in range(2):
+                p_tie, p_win, p_lose = block_equities[player][i]
+                features.append(policy_features(p_tie, p_win, p_lose, pot, stacks[player]))
+                cap = max_bid(stacks, player)
+                policy = policies[rng.integers(len(policies))]
+                if policy is None:
+                    bids.append(heuristic_bid(p_tie, p_win, p_lose, cap))
+                else:
+                    bids.append(policy.bid(features[player], pot, cap))
+            for player in range(2):
+                payoffs = np.empty(len(ARMS))
+                for arm, fraction in enumerate(ARMS):
+                    trial_bids = list(bids)
+                    trial_bids[player] = min(int(fraction*pot), stacks[player])
+                    payoffs[arm] = play_out(state, trial_bids).deltas[player]/pot
+                xtx += np.outer(features[player], features[player])
+                xty += np.outer(features[player], payoffs)
+    return xtx, xty, 2*auctions
+
+
+def fit(xtx, xty):
+    '''
+    Returns the (NUM_FEATURES, len(ARMS)) least squares payoff weights.
+    '''
+    return np.linalg.solve(xtx + RIDGE*np.eye(len(xtx)), xty)
+
+
+def load_table():
+    '''
+    Pool initializer, loads the auction equity table in each worker if it was built.
+    '''
+    global _table
+    try:
+        _table = AuctionTable.load()
+    except (OSError, ValueError):
+        _table = None
+
+
+def train(auctions, iterations, workers, seed=0, chunk=CHUNK):
+    '''
+    auctions (int): auctions simulated per iteration
+    iterations (int): rounds of fitting against the mix of earlier policies
+    workers (int): worker processes
+    seed (int): base seed of the per-job random generators
+
+    Returns the final AuctionPolicy
+    '''
+    opponents = [None]
+    with Pool(workers, initializer=load_table) as pool:
+        for iteration in range(iterations):
+            start_time = time.perf_counter()
+            jobs = [(opponents, min(chunk, auctions - start), seed + iteration*auctions + start)
+                    for start in range(0, auctions, chunk)]
+            xtx = np.zeros((NUM_FEATURES, NUM_FEATURES))
+            xty = np.zeros((NUM_FEATURES, len(ARMS)))
+            samples = 0
+            for job_xtx, job_xty, count in pool.imap_unordered(simulate, jobs):
+                xtx += job_xtx
+                xty += job_xty
+                samples += count
+            weights = fit(xtx, xty)
+            opponents.append(weights)
+            mean_features = xtx[0]/samples  # the first feature is the constant 1
+            print('iteration {}: {} samples in {:.1f}s, mean payoff per arm {}'.format(
+                iteration + 1, samples, time.perf_counter() - start_time,
+                ' '.join('{:g}:{:+.3f}'.format(arm, payoff) for arm, payoff in zip(ARMS, mean_features @ weights))))
+    return AuctionPolicy(weights)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python3 auction_selfplay.py')
+    parser.add_argument('--auctions', type=int, default=1000000, help='Auctions simulated per iteration')
+    parser.add_argument('--iterations', type=int, default=3, help='Self-play iterations')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='Base random seed')
+    parser.add_argument('--out', type=str, default=POLICY_PATH, help='Where to write the policy')
+    args = parser.parse_args()
+    policy = train(args.auctions, args.iterations, args.workers, args.seed)
+    policy.save(args.out, auctions=np.array(args.auctions), iterations=np.array(args.iterations))
+    print('Wrote', args.out)
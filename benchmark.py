@@ -0,0 +1,294 @@
+'''
+Decision latency benchmark for a pokerbot.
+
+  record  plays a seeded in-process self-play match and saves every call the engine
+          makes into the bot (new round, get_action, round over) as JSON situations
+  run     replays saved situations through a fresh bot, timing each call per street
+          and each equity estimator, and reports p50/p95/p99 latency and trials/second
+  compare flags phases whose latency regressed between two saved runs
+  commits runs the same situations against the bot at two git revisions and compares
+
+Usage:
+  python3 benchmark.py record main --out situations.json
+  python3 benchmark.py run main --situations situations.json --save after.json
+  python3 benchmark.py commits HEAD~1 HEAD --situations situations.json
+'''
+from collections import defaultdict
+from contextlib import redirect_stdout
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from config import *
+from simulator import HeadlessGame, InProcessPlayer, load_bot, PROFILE_VARIABLE
+from tournament import SEED_VARIABLE
+
+CALLS = ['handle_new_round', 'get_action', 'handle_round_over']
+ESTIMATORS = ['preflop_estimate', 'auction_estimate', 'round_estimate', 'range_estimate']  # round_estimate for older revisions
+STREETS = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+PERCENTILES = [50, 95, 99]
+MIN_REGRESSION_MS = 0.05  # ignore slowdowns smaller than timer noise
+
+
+def dump_state(state):
+    '''
+    Flattens a RoundState or TerminalState, its previous states and the round's action history
+    into JSON-friendly lists.
+    '''
+    terminal = None
+    if hasattr(state, 'deltas'):
+        terminal = [list(state.deltas), list(state.bids)]
+        state = state.previous_state
+    history = [[type(action).__name__, list(action)] for action in state.history()] if hasattr(state, 'history') else []
+    chain = []
+    while state is not None:
+        chain.append([state.button, state.street, state.auction, list(state.bids), list(state.pips),
+                      list(state.stacks), [list(hand) for hand in state.hands], list(state.deck),
+                      getattr(state, 'depth', 0)])
+        state = state.previous_state
+    return {'terminal': terminal, 'chain': chain[::-1], 'history': history}
+
+
+def load_state(data, runner_module):
+    '''
+    Rebuilds a state saved by dump_state with the bot's own skeleton classes, sharing one
+    action buffer like the Runner's states when the skeleton keeps one.
+    '''
+    keeps_history = hasattr(runner_module.RoundState, 'history')
+    actions = [getattr(runner_module, name)(*fields) for name, fields in data.get('history', [])]
+    state = None
+    for fields in data['chain']:
+        if keeps_history:
+            state = runner_module.RoundState(*fields[:8], state, actions, fields[8] if len(fields) > 8 else 0)
+        else:
+            state = runner_module.RoundState(*fields[:8], state)
+    if data['terminal'] is not None:
+        state = runner_module.TerminalState(data['terminal'][0], data['terminal'][1], state)
+    return state
+
+
+def phase(call, state):
+    '''
+    Names the phase a call belongs to, get_action calls are split by street.
+    '''
+    if call != 'get_action':
+        return call
+    return 'auction' if state.auction else STREETS[state.street]
+
+
+class RecordingPlayer(InProcessPlayer):
+    '''
+    An in-process player which saves every call made into its pokerbot.
+    '''
+
+    def __init__(self, name, path, events):
+        super().__init__(name, path)
+        self.events = events
+
+    def run(self):
+        super().run()
+        for call in CALLS:
+            method = getattr(self.pokerbot, call)
+
+            def recorder(game_state, state, active, call=call, method=method):
+                self.events.append([call, list(game_state), dump_state(state), active])
+                return method(game_state, state, active)
+            setattr(self.pokerbot, call, recorder)
+
+
+class RecordingGame(HeadlessGame):
+    '''
+    A self-play match that records the calls into the first seat's pokerbot.
+    '''
+
+    def __init__(self, path, seed):
+        super().__init__([('bench', path), ('opponent', path)], seed, log_format=None, hand_history=False, timing_report=False)
+        self.events = []
+
+    def make_players(self):
+        return [RecordingPlayer('bench', self.seats[0][1], self.events), InProcessPlayer('opponent', self.seats[1][1])]
+
+
+def record(path, seed, out):
+    '''
+    Records a self-play match of the bot at path and saves its situations.
+    '''
+    random.seed(seed)
+    os.environ[SEED_VARIABLE] = str(seed)
+    cwd = os.getcwd()
+    # the seats still write their bench.txt and opponent.txt logs, keep them out of the caller's directory
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as scratch, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        os.chdir(scratch)
+        try:
+            game = RecordingGame(os.path.join(cwd, path), seed)
+            game.run()
+        finally:
+            os.chdir(cwd)
+    with open(out, 'w') as out_file:
+        json.dump({'seed': seed, 'events': game.events}, out_file)
+    print('Recorded {} calls to {}'.format(len(game.events), out))
+
+
+def summarize(seconds):
+    '''
+    Returns latency statistics in milliseconds.
+    '''
+    ms = np.array(seconds) * 1000.
+    stats = {'count': len(ms), 'total': float(ms.sum()), 'max': float(ms.max())}
+    for percentile in PERCENTILES:
+        stats['p{}'.format(percentile)] = float(np.percentile(ms, percentile))
+    return stats
+
+
+def replay(path, situations, use_cache=False):
+    '''
+    Replays recorded situations through a fresh bot, returns latency statistics per phase and estimator.
+    '''
+    os.environ[PROFILE_VARIABLE] = ''  # replays must not read or write opponent profiles
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        pokerbot, runner_module = load_bot(os.path.abspath(path))
+    random.seed(situations['seed'])
+    if hasattr(pokerbot, 'rng'):
+        pokerbot.rng = np.random.default_rng(situations['seed'])
+    if not use_cache and hasattr(pokerbot, 'equity_cache'):
+        pokerbot.equity_cache.maxsize = 0
+
+    estimator_seconds = defaultdict(list)
+    estimator_trials = defaultdict(int)
+    for name in ESTIMATORS:
+        if hasattr(pokerbot, name):
+            def timed(*args, name=name, method=getattr(pokerbot, name)):
+                pokerbot.estimate = None
+                start_time = time.perf_counter()
+                result = method(*args)
+                estimator_seconds[name].append(time.perf_counter() - start_time)
+                if getattr(pokerbot, 'estimate', None) is not None:
+                    estimator_trials[name] += pokerbot.estimate.trials
+                return result
+            setattr(pokerbot, name, timed)
+
+    phase_seconds = defaultdict(list)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for call, game_state, state, active in situations['events']:
+            game_state = runner_module.GameState(*game_state)
+            state = load_state(state, runner_module)
+            method = getattr(pokerbot, call)
+            start_time = time.perf_counter()
+            method(game_state, state, active)
+            phase_seconds[phase(call, state)].append(time.perf_counter() - start_time)
+
+    results = {'phases': {}, 'estimators': {}}
+    for name, seconds in phase_seconds.items():
+        results['phases'][name] = summarize(seconds)
+    for name, seconds in estimator_seconds.items():
+        stats = summarize(seconds)
+        stats['trials'] = estimator_trials[name]
+        stats['trials_per_second'] = estimator_trials[name] / max(sum(seconds), 1e-9)
+        results['estimators'][name] = stats
+    if use_cache and hasattr(pokerbot, 'equity_cache'):
+        results['cache'] = pokerbot.equity_cache.stats()
+    return results
+
+
+def report(results):
+    print('{:<18} {:>7} {:>9} {:>9} {:>9} {:>9} {:>10}'.format('phase', 'calls', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'total ms'))
+    for group in ('phases', 'estimators'):
+        for name, stats in sorted(results[group].items()):
+            print('{:<18} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>10.1f}'.format(
+                name, stats['count'], stats['p50'], stats['p95'], stats['p99'], stats['max'], stats['total']))
+    for name, stats in sorted(results['estimators'].items()):
+        if stats['trials']:
+            print('{:<18} {:>12.0f} trials/s'.format(name, stats['trials_per_second']))
+    if 'cache' in results:
+        print(results['cache'])
+
+
+def compare(base, new, threshold):
+    '''
+    Prints p50/p95 changes per phase and returns the names that got slower than threshold allows.
+    '''
+    regressions = []
+    print('{:<18} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}'.format('phase', 'base p50', 'new p50', 'ratio', 'base p95', 'new p95', 'ratio'))
+    for group in ('phases', 'estimators'):
+        for name in sorted(set(base[group]) & set(new[group])):
+            old_stats, new_stats = base[group][name], new[group][name]
+            ratios = [new_stats[key] / max(old_stats[key], 1e-9) for key in ('p50', 'p95')]
+            slower = [ratio > 1 + threshold and new_stats[key] - old_stats[key] > MIN_REGRESSION_MS
+                      for ratio, key in zip(ratios, ('p50', 'p95'))]
+            flag = ' <- regression' if any(slower) else ''
+            if flag:
+                regressions.append(name)
+            print('{:<18} {:>10.3f} {:>10.3f} {:>8.2f} {:>10.3f} {:>10.3f} {:>8.2f}{}'.format(
+                name, old_stats['p50'], new_stats['p50'], ratios[0], old_stats['p95'], new_stats['p95'], ratios[1], flag))
+    return regressions
+
+
+def run_commit(revision, bot_dir, situations_path, out):
+    '''
+    Checks out a revision into a temporary git worktree and benchmarks its bot there.
+    '''
+    worktree = tempfile.mkdtemp(prefix='benchmark_')
+    subprocess.run(['git', 'worktree', 'add', '--detach', worktree, revision], check=True, stdout=subprocess.DEVNULL)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), 'run', os.path.join(worktree, bot_dir),
+                        '--situations', os.path.abspath(situations_path), '--save', out], check=True)
+    finally:
+        subprocess.run(['git', 'worktree', 'remove', '--force', worktree], check=False)
+        shutil.rmtree(worktree, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 benchmark.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='Record situations from a self-play match')
+    record_parser.add_argument('bot', help='Bot directory')
+    record_parser.add_argument('--seed', type=int, default=0)
+    record_parser.add_argument('--out', type=str, default='situations.json')
+    run_parser = commands.add_parser('run', help='Replay situations and report latencies')
+    run_parser.add_argument('bot', help='Bot directory')
+    run_parser.add_argument('--situations', type=str, default='situations.json')
+    run_parser.add_argument('--cache', action='store_true', help='Keep the equity cache enabled (fallback paths only) and report its hit rate')
+    run_parser.add_argument('--save', type=str, help='Write the results as JSON')
+    compare_parser = commands.add_parser('compare', help='Compare two saved runs')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative slowdown')
+    commits_parser = commands.add_parser('commits', help='Benchmark the bot at two git revisions')
+    commits_parser.add_argument('base')
+    commits_parser.add_argument('new')
+    commits_parser.add_argument('--bot-dir', type=str, default='main', help='Bot directory inside the repository')
+    commits_parser.add_argument('--situations', type=str, default='situations.json')
+    commits_parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative slowdown')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.bot, args.seed, args.out)
+    elif args.command == 'run':
+        with open(args.situations) as situations_file:
+            results = replay(args.bot, json.load(situations_file), args.cache)
+        report(results)
+        if args.save:
+            with open(args.save, 'w') as save_file:
+                json.dump(results, save_file, indent=1)
+    else:
+        if args.command == 'commits':
+            paths = ['benchmark_{}.json'.format(revision.replace('/', '_').replace('~', '-')) for revision in (args.base, args.new)]
+            for revision, path in zip((args.base, args.new), paths):
+                run_commit(revision, args.bot_dir, args.situations, path)
+        else:
+            paths = [args.base, args.new]
+        with open(paths[0]) as base_file, open(paths[1]) as new_file:
+            regressions = compare(json.load(base_file), json.load(new_file), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+'''
+Consistency checks for the bot's fast code paths, reproducible from the command line.
+
+  batch_eval  batch_eval.evaluate orders random 5 to 8 card hands exactly like eval7.evaluate
+  transport   the engine's and the skeleton's FramedChannel exchange messages both ways
+  states      the engine's and the skeleton's RoundState play random rounds identically, and every
+              action taken, including the check closing a river showdown, is in the final history
+  opponent    OpponentStats.record_round counts each of the opponent's actions exactly once
+  auction     AuctionTable.lookup answers every flop alike under suit relabelling, each lookup
+              within LOOKUP_LIMIT seconds on average
+
+Every check prints what it compared and exits non-zero on the first mismatch.
+
+Usage: python3 checks.py [CHECK ...] [--hands N] [--seed S]
+'''
+import argparse
+import os
+import socket
+import sys
+import time
+
+import eval7
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main'))
+import auction_table  # noqa: E402
+import batch_eval  # noqa: E402
+import engine  # noqa: E402
+import opponent  # noqa: E402
+from skeleton import actions, states, transport  # noqa: E402
+
+LOOKUP_LIMIT = 200e-6  # seconds per auction table lookup, a few times what a binary search of the keys takes
+
+
+def dense_ranks(scores):
+    '''
+    Returns each score's position among the distinct scores, so two scorings order hands
+    the same way exactly when their dense ranks are equal.
+    '''
+    return np.unique(scores, return_inverse=True)[1]
+
+
+def check_batch_eval(hands, seed):
+    '''
+    Scores random hands of every size with both evaluators and compares their order.
+    '''
+    rng = np.random.default_rng(seed)
+    deck = eval7.Deck().cards  # in batch_eval code order
+    for size in range(5, 9):
+        codes = rng.random((hands, 52)).argsort(axis=1)[:, :size].astype(np.uint8)
+        ours = batch_eval.evaluate(codes)
+        theirs = np.array([eval7.evaluate([deck[code] for code in hand]) for hand in codes])
+        mismatched = np.flatnonzero(dense_ranks(ours) != dense_ranks(theirs))
+        if len(mismatched):
+            hand = batch_eval.decode(codes[mismatched[0]])
+            raise AssertionError('{} card hands ordered differently from eval7, e.g. {}'.format(size, hand))
+        categories = np.bincount(ours >> 20, minlength=9)
+        print('batch_eval: {} random {} card hands ordered like eval7, categories {}'.format(
+            hands, size, ' '.join(str(count) for count in categories)))
+
+
+def check_transport(messages, seed):
+    '''
+    Sends random engine packets and bot responses through a socket pair, engine
+    FramedChannel on one end and the skeleton's on the other.
+    '''
+    rng = np.random.default_rng(seed)
+    engine_socket, bot_socket = socket.socketpair()
+    engine_end, bot_end = engine.FramedChannel(engine_socket), transport.FramedChannel(bot_socket)
+    clauses = ['T29.5', 'P0', 'H' + ','.join(batch_eval.decode(rng.choice(52, 2, replace=False))), 'R14', 'K', 'A37', 'B2c,7s,9d', 'D-12']
+    for i in range(messages):
+        packet = ' '.join(rng.choice(clauses, rng.integers(1, 6))) + '\n'
+        engine_end.write(packet)
+        engine_end.flush()
+        if bot_end.readline() != packet:
+            raise AssertionError('skeleton read a different packet than the engine sent: {!r}'.format(packet))
+        response = rng.choice(['K', 'C', 'F', 'R20', 'A5']) + '\n'
+        bot_end.write(response)
+        bot_end.flush()
+        if engine_end.readline() != response:
+            raise AssertionError('engine read a different response than the skeleton sent: {!r}'.format(response))
+    bot_end.close()
+    if engine_end.readline() != '':
+        raise AssertionError('engine did not see the closed connection')
+    engine_end.close()
+    print('transport: {} packets and responses round-tripped between engine and skeleton framing'.format(messages))
+
+
+def random_action(state, rng, passive):
+    '''
+    Returns a random legal engine action; passive rounds only check, call and bid 0.
+    '''
+    legal = state.legal_actions()
+    if engine.BidAction in legal:
+        low, high = state.bid_bounds()
+        return engine.BidAction(low if passive else int(rng.integers(low, high + 1)))
+    if passive:
+        return engine.CheckAction() if engine.CheckAction in legal else engine.CallAction()
+    action = rng.choice(sorted(legal, key=lambda kind: kind.__name__))
+    if action is engine.RaiseAction:
+        low, high = state.raise_bounds()
+        return engine.RaiseAction(int(rng.integers(low, high + 1)))
+    return action()
+
+
+COUNTERPARTS = {engine.FoldAction: actions.FoldAction, engine.CallAction: actions.CallAction,
+                engine.CheckAction: actions.CheckAction, engine.RaiseAction: actions.RaiseAction,
+                engine.BidAction: actions.BidAction}  # skeleton class of each engine action
+
+
+def mirrored_round(rng, passive, label):
+    '''
+    Plays one random round on the engine's RoundState and mirrors every action on the
+    skeleton's, filling in the auction result like the Runner's N clause does.
+
+    Returns (engine terminal state, skeleton terminal state, [(player, street, auction, skeleton action)]).
+    '''
+    deck = eval7.Deck()
+    deck.cards = [deck.cards[code] for code in rng.permutation(52)]
+    hands = [deck.deal(2), deck.deal(2)]
+    ours = engine.RoundState(0, 0, False, [None, None], [engine.SMALL_BLIND, engine.BIG_BLIND],
+                             [engine.STARTING_STACK - engine.SMALL_BLIND, engine.STARTING_STACK - engine.BIG_BLIND],
+                             hands, deck, None)
+    theirs = states.RoundState(0, 0, False, [None, None], [states.SMALL_BLIND, states.BIG_BLIND],
+                               [states.STARTING_STACK - states.SMALL_BLIND, states.STARTING_STACK - states.BIG_BLIND],
+                               [[str(card) for card in hands[0]], []], [], None)
+    taken = []
+    while True:
+        action = random_action(ours, rng, passive)
+        mirror = COUNTERPARTS[type(action)](*action)
+        taken.append((theirs.button % 2, theirs.street, theirs.auction, mirror))
+        ours = ours.proceed(action)
+        theirs = theirs.proceed(mirror)
+        if isinstance(ours, engine.TerminalState) or isinstance(theirs, states.TerminalState):
+            break
+        if -1 in theirs.bids:  # the engine resolves the auction, the bot learns it from the N clause
+            theirs.bids, theirs.stacks = list(ours.bids), list(ours.stacks)
+        mirrored = (theirs.button, theirs.street, theirs.auction, theirs.bids, theirs.pips, theirs.stacks, theirs.depth)
+        if mirrored != (ours.button, ours.street, ours.auction, ours.bids, ours.pips, ours.stacks, ours.depth):
+            raise AssertionError('{} diverged after {}: engine {} but skeleton {}'.format(label, ours.history(), ours, theirs))
+    if not isinstance(ours, engine.TerminalState) or not isinstance(theirs, states.TerminalState):
+        raise AssertionError('{} ended in only one of the two trees after {}'.format(label, [step[3] for step in taken]))
+    return ours, theirs, taken
+
+
+def check_states(rounds, seed):
+    '''
+    Plays random rounds in both trees and checks the final histories hold every action taken.
+    '''
+    rng = np.random.default_rng(seed)
+    checked_down = 0
+    for i in range(rounds):
+        passive = i % 4 == 0
+        ours, theirs, taken = mirrored_round(rng, passive, 'round {}'.format(i))
+        kept = [step for step in taken if not isinstance(step[3], actions.FoldAction)]
+        for state in (ours.previous_state, theirs.previous_state):
+            if len(state.history()) != len(kept):
+                raise AssertionError('round {} took {} actions but its final history holds {}'.format(i, len(kept), state.history()))
+        if len(kept) == len(taken) and ours.previous_state.street == 5:
+            checked_down += passive
+    if rounds and not checked_down:
+        raise AssertionError('no round was checked down to a river showdown')
+    print('states: {} random rounds played alike in both trees, {} checked down to a showdown with full histories'.format(
+        rounds, checked_down))
+
+
+def check_opponent(rounds, seed):
+    '''
+    Records random rounds with OpponentStats and compares its per street counters with a
+    direct count of the opponent's actions, the river check closing a showdown included.
+    '''
+    rng = np.random.default_rng(seed)
+    stats = opponent.OpponentStats()
+    names = {actions.CheckAction: 'checks', actions.CallAction: 'calls', actions.RaiseAction: 'raises', actions.FoldAction: 'folds'}
+    for i in range(rounds):
+        _, theirs, taken = mirrored_round(rng, i % 4 == 0, 'round {}'.format(i))
+        active = int(rng.integers(2))
+        expected = np.zeros(opponent.NUM_COUNTERS)
+        for player, street, auction, action in taken:
+            if player != active and not auction:
+                expected[opponent.street_counter(street, 'acted')] = 1
+                expected[opponent.street_counter(street, names[type(action)])] += 1
+        stats.record_round(theirs, active)
+        for street in opponent.STREETS:
+            for name in ['acted'] + list(names.values()):
+                counter = opponent.street_counter(street, name)
+                if stats.row[counter] != expected[counter]:
+                    raise AssertionError('round {} counted {} opponent {} on street {} for {}'.format(
+                        i, stats.row[counter], name, street, [step[3] for step in taken]))
+    print('opponent: {} random rounds counted action by action, checked down rivers included'.format(rounds))
+
+
+def check_auction(lookups, seed):
+    '''
+    Looks up random flops and their suit relabellings in the shipped auction table and
+    times the lookups.
+    '''
+    rng = np.random.default_rng(seed)
+    table = auction_table.AuctionTable.load()
+    situations = [rng.choice(52, 5, replace=False) for _ in range(lookups)]
+    start = time.perf_counter()
+    answers = [table.lookup(batch_eval.decode(codes[:2]), batch_eval.decode(codes[2:])) for codes in situations]
+    per_lookup = (time.perf_counter() - start)/max(lookups, 1)
+    for codes, answer in zip(situations, answers):
+        relabelled = auction_table.PERMUTED[rng.integers(len(auction_table.PERMUTED)), codes]
+        hand, flop = batch_eval.decode(codes[:2]), batch_eval.decode(codes[2:])
+        if answer is None:
+            raise AssertionError('no table entry for {} on {}'.format(hand, flop))
+        if table.lookup(batch_eval.decode(relabelled[:2]), batch_eval.decode(relabelled[2:])) != answer:
+            raise AssertionError('{} on {} answered differently after relabelling suits'.format(hand, flop))
+    if per_lookup > LOOKUP_LIMIT:
+        raise AssertionError('lookups took {:.0f} us each, over the {:.0f} us limit'.format(per_lookup*1e6, LOOKUP_LIMIT*1e6))
+    print('auction: {} random flops found and relabelled alike, {:.0f} us per lookup'.format(lookups, per_lookup*1e6))
+
+
+CHECKS = {'batch_eval': check_batch_eval, 'transport': check_transport, 'states': check_states,
+          'opponent': check_opponent, 'auction': check_auction}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python3 checks.py')
+    parser.add_argument('checks', nargs='*', help='Checks to run, all by default: ' + ', '.join(CHECKS))
+    parser.add_argument('--hands', type=int, default=20000, help='Random hands or rounds per check')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error('unknown check {}'.format(name))
+    try:
+        for name in args.checks or CHECKS:
+            CHECKS[name](args.hands, args.seed)
+    except AssertionError as error:
+        print('FAILED', name, error)
+        sys.exit(1)
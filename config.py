@@ -7,13 +7,27 @@ PLAYER_2_NAME = 'v4'
 PLAYER_2_PATH = './version_4'
 # GAME PROGRESS IS RECORDED HERE
 GAME_LOG_FILENAME = 'gamelog'
+# GAME_LOG_FORMAT IS 'text', 'gzip' OR None TO TURN THE GAME LOG OFF
+GAME_LOG_FORMAT = 'text'
+# ONLY EVERY GAME_LOG_SAMPLE-TH ROUND IS WRITTEN TO THE GAME LOG
+GAME_LOG_SAMPLE = 1
+# HAND_HISTORY ALSO WRITES A BINARY HAND HISTORY (.hands AND .actions), READ IT WITH handhistory.py
+HAND_HISTORY = False
+# TIMING_REPORT WRITES EACH PLAYER'S RESPONSE TIMES BY STREET AND ACTION TO GAME_LOG_FILENAME_timing.json
+TIMING_REPORT = True
 # PLAYER_LOG_SIZE_LIMIT IS IN BYTES
 PLAYER_LOG_SIZE_LIMIT = 524288
+# TRANSPORT 'unix' OFFERS BOTS A UNIX DOMAIN SOCKET WITH FRAMED MESSAGES AT CONNECT, 'tcp' KEEPS THE TEXT STREAM
+TRANSPORT = 'tcp'
 # STARTING_GAME_CLOCK AND TIMEOUTS ARE IN SECONDS
 ENFORCE_GAME_CLOCK = True
 STARTING_GAME_CLOCK = 30.
 BUILD_TIMEOUT = 10.
 CONNECT_TIMEOUT = 10.
+# SEED FOR THE DEALS, None SHUFFLES UNPREDICTABLY
+GAME_SEED = None
+# DUPLICATE_DEALS REPLAYS EVERY DEAL WITH SEATS SWAPPED IN THE NEXT ROUND
+DUPLICATE_DEALS = False
 # THE GAME VARIANT FIXES THE PARAMETERS BELOW
 # CHANGE ONLY FOR TRAINING OR EXPERIMENTATION
 NUM_ROUNDS = 1000
@@ -21,16 +21,22 @@ each of the skeleton bot files accordingly
 from collections import namedtuple
 from threading import Thread
 from queue import Queue
+import random
 import time
+import gzip
 import json
+import struct
 import subprocess
 import socket
+import shutil
+import tempfile
 import eval7
 import sys
 import os
 
 sys.path.append(os.getcwd())
 from config import *
+from handhistory import HISTORY_VERSION, HISTORY_HEADER, HAND_RECORD, ACTION_RECORD, NO_CARD, FOLD, CALL, CHECK, RAISE, BID
 
 FoldAction = namedtuple('FoldAction', [])
 CallAction = namedtuple('CallAction', [])
@@ -47,6 +53,87 @@ CCARDS = lambda cards: ','.join(map(str, cards))
 PCARDS = lambda cards: '[{}]'.format(' '.join(map(str, cards)))
 PVALUE = lambda name, value: ', {} ({})'.format(name, value)
 STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
+TIMING_STREETS = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+TIMING_ACTIONS = {'F': 'fold', 'C': 'call', 'K': 'check', 'R': 'raise', 'A': 'bid'}
+
+
+FRAME_HEADER = struct.Struct('<I')
+
+
+class FramedChannel():
+    '''
+    File-like wrapper over a stream socket that sends each flushed message as one
+    length-prefixed frame. Mirrors skeleton/transport.py on the bot side: like
+    RoundState, the engine keeps its own copy so it never depends on one bot's
+    directory. python3 checks.py transport checks that the two still agree.
+    '''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = []
+
+    def write(self, message):
+        self.buffer.append(message)
+
+    def flush(self):
+        data = ''.join(self.buffer).rstrip('\n').encode()
+        self.buffer = []
+        self.sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+    def recv_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def readline(self):
+        header = self.recv_exactly(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return ''
+        return self.recv_exactly(FRAME_HEADER.unpack(header)[0]).decode() + '\n'
+
+    def close(self):
+        if self.buffer:
+            try:
+                self.flush()
+            except OSError:
+                pass
+        self.sock.close()
+
+
+def think_time(response):
+    '''
+    Returns the think time a pokerbot appended to its response as 't<seconds>', or None.
+    '''
+    if len(response) > 1 and response[1][:1] == 't':
+        try:
+            return float(response[1][1:])
+        except ValueError:
+            pass
+    return None
+
+
+def timing_stats(samples):
+    '''
+    Summarizes (response seconds, think seconds or None) samples.
+    '''
+    times = sorted(elapsed for elapsed, _ in samples)
+    thinks = [(elapsed, think) for elapsed, think in samples if think is not None]
+    stats = {
+        'count': len(times),
+        'total': sum(times),
+        'mean': sum(times) / len(times),
+        'p50': times[len(times) // 2],
+        'p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'max': times[-1],
+    }
+    if thinks:
+        stats['think'] = sum(think for _, think in thinks)
+        stats['overhead'] = sum(elapsed - think for elapsed, think in thinks)
+    return stats
 
 # Socket encoding scheme:
 #
@@ -71,10 +158,58 @@ STATUS = lambda players: ''.join([PVALUE(p.name, p.bankroll) for p in players])
 # Action history is sent once, including the player's actions
 
 
-class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
+class RoundState():
     '''
     Encodes the game tree for one round of poker.
+
+    States are small __slots__ objects, and lists a step leaves unchanged are shared
+    with the next state instead of copied. All states of a round share one action
+    buffer, so history() and undo() are cheap; a state proceeds from the middle of
+    the buffer (e.g. in a tree search) by copying the part it needs first.
     '''
+    __slots__ = ['button', 'street', 'auction', 'bids', 'pips', 'stacks', 'hands', 'deck', 'previous_state', 'actions', 'depth']
+
+    def __init__(self, button, street, auction, bids, pips, stacks, hands, deck, previous_state, actions=None, depth=0):
+        self.button = button
+        self.street = street
+        self.auction = auction
+        self.bids = bids
+        self.pips = pips
+        self.stacks = stacks
+        self.hands = hands
+        self.deck = deck
+        self.previous_state = previous_state
+        self.actions = [] if actions is None else actions
+        self.depth = depth
+
+    def __repr__(self):
+        return 'RoundState(button={}, street={}, auction={}, bids={}, pips={}, stacks={}, hands={})'.format(
+            self.button, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands)
+
+    def history(self):
+        '''
+        Returns the list of actions taken this round up to this state.
+        '''
+        return self.actions[:self.depth]
+
+    def undo(self):
+        '''
+        Returns the state before the last action, or None at the start of the round.
+        '''
+        state = self.previous_state
+        while state is not None and state.depth == self.depth:
+            state = state.previous_state
+        return state
+
+    def record(self, action):
+        '''
+        Appends an action to the round's buffer and returns (buffer, depth) for the next state.
+        '''
+        actions = self.actions
+        if len(actions) != self.depth:  # another line was played from here, keep it intact
+            actions = actions[:self.depth]
+        actions.append(action)
+        return actions, self.depth + 1
 
     def showdown(self):
         '''
@@ -131,13 +266,12 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids
         '''
         Resets the players' pips and advances the game tree to the next round of betting.
         '''
+        actions, depth = self.actions, self.depth
         if self.street == 5:
             return self.showdown()
         if self.street == 0:        # immediately after flop is dealt, we enter the auction
-            return RoundState(1, 3, True, self.bids, [0, 0], self.stacks, self.hands, self.deck, self)
-        # new_street = 3 if self.street == 0 else self.street + 1
-        # return RoundState(1, new_street, [0, 0], self.stacks, self.hands, self.deck, self)
-        return RoundState(1, self.street + 1, False, self.bids, [0, 0], self.stacks, self.hands, self.deck, self)
+            return RoundState(1, 3, True, self.bids, [0, 0], self.stacks, self.hands, self.deck, self, actions, depth)
+        return RoundState(1, self.street + 1, False, self.bids, [0, 0], self.stacks, self.hands, self.deck, self, actions, depth)
 
     def proceed(self, action):
         '''
@@ -147,51 +281,56 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids
         if isinstance(action, FoldAction):
             delta = self.stacks[0] - STARTING_STACK if active == 0 else STARTING_STACK - self.stacks[1]
             return TerminalState([delta, -delta], self.bids, self)
+        actions, depth = self.record(action)
         if isinstance(action, CallAction):
             if self.button == 0:  # sb calls bb preflop
-                return RoundState(1, 0, self.auction, self.bids, [BIG_BLIND] * 2, [STARTING_STACK - BIG_BLIND] * 2, self.hands, self.deck, self)
+                return RoundState(1, 0, self.auction, self.bids, [BIG_BLIND] * 2, [STARTING_STACK - BIG_BLIND] * 2, self.hands, self.deck, self,
+                                  actions, depth)
             # both players acted
-            new_pips = list(self.pips)
+            contribution = self.pips[1-active] - self.pips[active]
+            new_pips = [self.pips[1-active]] * 2
             new_stacks = list(self.stacks)
-            contribution = new_pips[1-active] - new_pips[active]
             new_stacks[active] -= contribution
-            new_pips[active] += contribution
-            state = RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self)
+            state = RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self,
+                               actions, depth)
             return state.proceed_street()
         if isinstance(action, CheckAction):
             if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
-                return self.proceed_street()
+                # step to a state holding the check first, so a showdown's history ends with it
+                state = RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self,
+                                   actions, depth)
+                return state.proceed_street()
             # let opponent act
-            return RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
+            return RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self,
+                              actions, depth)
         if isinstance(action, BidAction):
-            self.bids[active] = action.amount 
-            if None not in self.bids:       # both players have submitted bids and we deal the extra card
+            # bids and hands are copied, not updated in place, so earlier states stay valid for undo
+            new_bids = list(self.bids)
+            new_bids[active] = action.amount
+            if None not in new_bids:       # both players have submitted bids and we deal the extra card
+                new_hands = [list(self.hands[0]), list(self.hands[1])]
+                new_stacks = list(self.stacks)
                 # case in which bids are equal, both players receive card
-                if self.bids[0] == self.bids[1]:
-                    self.hands[0].append(self.deck.peek(48)[-1])
-                    self.hands[1].append(self.deck.peek(48)[-2])
-                    new_stacks = list(self.stacks)
-                    new_stacks[0] -= self.bids[0]
-                    new_stacks[1] -= self.bids[1]
-                    state = RoundState(1, self.street, False, self.bids, self.pips, new_stacks, self.hands, self.deck, self)
+                if new_bids[0] == new_bids[1]:
+                    new_hands[0].append(self.deck.peek(48)[-1])
+                    new_hands[1].append(self.deck.peek(48)[-2])
+                    new_stacks[0] -= new_bids[0]
+                    new_stacks[1] -= new_bids[1]
                 else:
                 # case in which bids are not equal
-                    winner = self.bids.index(max(self.bids))
-                    self.hands[winner].append(self.deck.peek(48)[-1])
-                    new_stacks = list(self.stacks)
-                    new_stacks[winner] -= self.bids[1 - winner]
-                    state = RoundState(1, self.street, False, self.bids, self.pips, new_stacks, self.hands, self.deck, self)
-                return state
-            else:
-                return RoundState(self.button + 1, self.street, True, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
+                    winner = new_bids.index(max(new_bids))
+                    new_hands[winner].append(self.deck.peek(48)[-1])
+                    new_stacks[winner] -= new_bids[1 - winner]
+                return RoundState(1, self.street, False, new_bids, self.pips, new_stacks, new_hands, self.deck, self, actions, depth)
+            return RoundState(self.button + 1, self.street, True, new_bids, self.pips, self.stacks, self.hands, self.deck, self, actions, depth)
         if isinstance(action, RaiseAction):
+            contribution = action.amount - self.pips[active]
             new_pips = list(self.pips)
             new_stacks = list(self.stacks)
-            contribution = action.amount - new_pips[active]
             new_stacks[active] -= contribution
-            new_pips[active] += contribution
-            return RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self)
-        
+            new_pips[active] = action.amount
+            return RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self,
+                              actions, depth)
 
 
 class Player():
@@ -208,6 +347,8 @@ class Player():
         self.bot_subprocess = None
         self.socketfile = None
         self.bytes_queue = Queue()
+        self.reports_think_time = False
+        self.timings = {}
 
     def build(self):
         '''
@@ -274,6 +415,7 @@ class Player():
                         sock = client_socket.makefile('rw')
                         self.socketfile = sock
                         print(self.name, 'connected successfully')
+                        self.handshake()
             except (TypeError, ValueError):
                 print(self.name, 'run command misformatted')
             except OSError:
@@ -281,6 +423,64 @@ class Player():
             except socket.timeout:
                 print('Timed out waiting for', self.name, 'to connect')
 
+    def handshake(self):
+        '''
+        Asks the pokerbot to append its think time to every response, before the game clock starts.
+        With TRANSPORT = 'unix' it is also offered a Unix domain socket with framed messages (U clause),
+        which it accepts by adding 'u' to its response.
+        Pokerbots that do not know these clauses just acknowledge them with a plain check and stay on TCP.
+        '''
+        listener = None
+        try:
+            message = 'X'
+            if TRANSPORT == 'unix' and hasattr(socket, 'AF_UNIX'):
+                socket_dir = tempfile.mkdtemp(prefix='pokerbots_')
+                listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                listener.bind(os.path.join(socket_dir, self.name + '.sock'))
+                listener.settimeout(CONNECT_TIMEOUT)
+                listener.listen()
+                message += ' U' + listener.getsockname()
+            self.socketfile.write(message + '\n')
+            self.socketfile.flush()
+            response = self.socketfile.readline().strip().split(' ')
+            self.reports_think_time = think_time(response) is not None
+            if listener is not None and 'u' in response[1:]:
+                client_socket, _ = listener.accept()
+                client_socket.settimeout(CONNECT_TIMEOUT)
+                self.socketfile.close()
+                self.socketfile = FramedChannel(client_socket)
+                print(self.name, 'switched to a Unix domain socket')
+        except OSError:
+            print(self.name, 'did not complete the handshake')
+        finally:
+            if listener is not None:
+                listener.close()
+                shutil.rmtree(socket_dir, ignore_errors=True)
+
+    def record_timing(self, round_state, clause, elapsed, think):
+        '''
+        Files one query's response time under its street and the action returned.
+        '''
+        if not isinstance(round_state, RoundState):
+            street = 'ack'
+        else:
+            street = 'auction' if round_state.auction else TIMING_STREETS[round_state.street]
+        key = street + '/' + TIMING_ACTIONS.get(clause[:1], 'invalid')
+        self.timings.setdefault(key, []).append((elapsed, think))
+
+    def timing_report(self):
+        '''
+        Returns this player's response times as a JSON-friendly dict.
+        Overhead is response time minus the think time the pokerbot reported, i.e. socket and process switching.
+        '''
+        samples = [sample for key_samples in self.timings.values() for sample in key_samples]
+        return {
+            'game_clock': self.game_clock,
+            'reports_think_time': self.reports_think_time,
+            'all': timing_stats(samples) if samples else None,
+            'by_street_action': {key: timing_stats(key_samples) for key, key_samples in sorted(self.timings.items())},
+        }
+
     def stop(self):
         '''
         Closes the socket connection and stops the pokerbot.
@@ -327,12 +527,14 @@ class Player():
                 start_time = time.perf_counter()
                 self.socketfile.write(message)
                 self.socketfile.flush()
-                clause = self.socketfile.readline().strip()
+                response = self.socketfile.readline().strip().split(' ')
                 end_time = time.perf_counter()
+                clause = response[0]
                 if ENFORCE_GAME_CLOCK:
                     self.game_clock -= end_time - start_time
                 if self.game_clock <= 0.:
                     raise socket.timeout
+                self.record_timing(round_state, clause, end_time - start_time, think_time(response))
                 action = DECODE[clause[0]]
                 if action in legal_actions:
                     if clause[0] == 'R':
@@ -383,14 +585,134 @@ class Player():
         return CheckAction() if CheckAction in legal_actions else FoldAction()
 
 
+class GameLog():
+    '''
+    Streams the game log to disk one round at a time instead of holding it in memory.
+    '''
+
+    def __init__(self, name, log_format=GAME_LOG_FORMAT, sample=GAME_LOG_SAMPLE):
+        if log_format == 'gzip':
+            self.file = gzip.open(name + '.txt.gz', 'wt')
+        elif log_format == 'text':
+            self.file = open(name + '.txt', 'w')
+        else:
+            self.file = None
+        self.sample = sample
+        self.enabled = self.file is not None
+        self.lines = []
+        self.empty = True
+
+    def append(self, line):
+        '''
+        Buffers one line of the current round.
+        '''
+        if self.enabled:
+            self.lines.append(line)
+
+    def start_round(self, round_num=None):
+        '''
+        Decides whether the round is sampled into the log, None always logs.
+        '''
+        self.enabled = self.file is not None and (round_num is None or (round_num - 1) % self.sample == 0)
+
+    def flush(self):
+        '''
+        Writes out the buffered lines, so a crash loses at most the current round.
+        '''
+        if self.file is not None and self.lines:
+            self.file.write(('' if self.empty else '\n') + '\n'.join(self.lines))
+            self.file.flush()
+            self.empty = False
+        self.lines = []
+
+    def close(self):
+        '''
+        Writes the remaining lines and closes the file.
+        '''
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+
+
+ACTION_CODES = {FoldAction: FOLD, CallAction: CALL, CheckAction: CHECK, RaiseAction: RAISE, BidAction: BID}
+
+
+class HandHistory():
+    '''
+    Writes the binary hand history, flushed once per round like the game log.
+    '''
+
+    def __init__(self, name, player_names):
+        self.player_names = list(player_names)
+        encoded_names = [player_name.encode()[:16] for player_name in self.player_names]
+        self.hands_file = open(name + '.hands', 'wb')
+        self.hands_file.write(HISTORY_HEADER.pack(b'PBHH', HISTORY_VERSION, *encoded_names))
+        self.actions_file = open(name + '.actions', 'wb')
+        self.actions_file.write(HISTORY_HEADER.pack(b'PBHA', HISTORY_VERSION, *encoded_names))
+        self.round_num = 0
+        self.num_actions = 0
+        self.first_action = 0
+
+    def action(self, round_state, action):
+        '''
+        Records one action taken from round_state.
+        '''
+        amount = action.amount if isinstance(action, (RaiseAction, BidAction)) else 0
+        self.actions_file.write(ACTION_RECORD.pack(self.round_num + 1, round_state.street, round_state.button % 2,
+                                                   ACTION_CODES[type(action)], amount))
+        self.num_actions += 1
+
+    def end_round(self, players, terminal_state):
+        '''
+        Records the round's cards, bids and deltas and flushes both files.
+        '''
+        self.round_num += 1
+        previous_state = terminal_state.previous_state
+        cards = []
+        for hand in previous_state.hands:
+            codes = [card.rank * 4 + card.suit for card in hand]
+            cards += codes + [NO_CARD] * (3 - len(codes))
+        board = [card.rank * 4 + card.suit for card in previous_state.deck.peek(5)]
+        bids = [-1 if bid is None else bid for bid in terminal_state.bids]
+        showdown = FoldAction not in previous_state.legal_actions()
+        self.hands_file.write(HAND_RECORD.pack(self.round_num, self.player_names.index(players[0].name), *cards, *board,
+                                               previous_state.street, showdown, *bids, *terminal_state.deltas,
+                                               self.first_action, self.num_actions - self.first_action))
+        self.first_action = self.num_actions
+        self.hands_file.flush()
+        self.actions_file.flush()
+
+    def close(self):
+        self.hands_file.close()
+        self.actions_file.close()
+
+
 class Game():
     '''
     Manages logging and the high-level game procedure.
     '''
 
-    def __init__(self):
-        self.log = ['6.9630 MIT Pokerbots - ' + PLAYER_1_NAME + ' vs ' + PLAYER_2_NAME]
+    def __init__(self, seed=GAME_SEED, duplicate=DUPLICATE_DEALS, log_format=GAME_LOG_FORMAT, log_sample=GAME_LOG_SAMPLE,
+                 hand_history=HAND_HISTORY, timing_report=TIMING_REPORT):
+        self.log = None
+        self.timing_report = timing_report
+        self.log_format = log_format
+        self.log_sample = log_sample
+        self.hand_history = hand_history
+        self.history = None
         self.player_messages = [[], []]
+        # deals come from their own random source, so bots using random can not disturb them
+        self.deck_rng = random.Random(seed)
+        self.duplicate = duplicate
+
+    def make_players(self):
+        '''
+        Creates the two players, in seat order for the first round.
+        '''
+        return [
+            Player(PLAYER_1_NAME, PLAYER_1_PATH),
+            Player(PLAYER_2_NAME, PLAYER_2_PATH)
+        ]
 
     def log_round_state(self, players, round_state):
         '''
@@ -466,12 +788,20 @@ class Game():
         self.player_messages[0].append('D' + str(round_state.deltas[0]))
         self.player_messages[1].append('D' + str(round_state.deltas[1]))
 
-    def run_round(self, players):
+    def shuffled_cards(self):
+        '''
+        Returns the cards of a freshly shuffled deck, in dealing order.
+        '''
+        cards = eval7.Deck().cards
+        self.deck_rng.shuffle(cards)
+        return cards
+
+    def run_round(self, players, cards=None):
         '''
-        Runs one round of poker (1 hand).
+        Runs one round of poker (1 hand), dealing from the given card order if any.
         '''
         deck = eval7.Deck()
-        deck.shuffle()
+        deck.cards = list(cards) if cards is not None else self.shuffled_cards()
         hands = [deck.deal(2), deck.deal(2)]
         auction = False
         bids = [None, None]
@@ -485,15 +815,19 @@ class Game():
             action = player.query(round_state, self.player_messages[active], self.log)
             bet_override = (round_state.pips == [0, 0])
             self.log_action(player.name, action, bet_override)
+            if self.history is not None:
+                self.history.action(round_state, action)
             round_state = round_state.proceed(action)
         self.log_terminal_state(players, round_state)
+        if self.history is not None:
+            self.history.end_round(players, round_state)
         for player, player_message, delta in zip(players, self.player_messages, round_state.deltas):
             player.query(round_state, player_message, self.log)
             player.bankroll += delta
 
     def run(self):
         '''
-        Runs one game of poker.
+        Runs one game of poker and returns the players with their final bankrolls.
         '''
         print('   __  _____________  ___       __           __        __    ')
         print('  /  |/  /  _/_  __/ / _ \\___  / /_____ ____/ /  ___  / /____')
@@ -501,26 +835,47 @@ class Game():
         print('/_/  /_/___/ /_/   /_/   \\___/_/\\_\\\\__/_/ /_.__/\\___/\\__/___/')
         print()
         print('Starting the Pokerbots engine...')
-        players = [
-            Player(PLAYER_1_NAME, PLAYER_1_PATH),
-            Player(PLAYER_2_NAME, PLAYER_2_PATH)
-        ]
+        players = self.make_players()
+        self.log = GameLog(GAME_LOG_FILENAME, self.log_format, self.log_sample)
+        self.log.append('6.9630 MIT Pokerbots - ' + players[0].name + ' vs ' + players[1].name)
+        self.log.flush()
+        if self.hand_history:
+            self.history = HandHistory(GAME_LOG_FILENAME, [player.name for player in players])
         for player in players:
             player.build()
             player.run()
         for round_num in range(1, NUM_ROUNDS + 1):
+            self.log.start_round(round_num)
             self.log.append('')
             self.log.append('Round #' + str(round_num) + STATUS(players))
-            self.run_round(players)
+            # in duplicate mode the even rounds replay the previous deal, and seats swap every round
+            if not self.duplicate or round_num % 2 == 1:
+                cards = self.shuffled_cards()
+            self.run_round(players, cards)
+            self.log.flush()
             players = players[::-1]
+        self.log.start_round()
         self.log.append('')
         self.log.append('Final' + STATUS(players))
         for player in players:
             player.stop()
-        name = GAME_LOG_FILENAME + '.txt'
-        print('Writing', name)
-        with open(name, 'w') as log_file:
-            log_file.write('\n'.join(self.log))
+        if self.log.file is not None:
+            print('Writing', self.log.file.name)
+        self.log.close()
+        if self.history is not None:
+            self.history.close()
+        if self.timing_report:
+            self.write_timing_report(players)
+        return players
+
+    def write_timing_report(self, players):
+        '''
+        Writes every player's response times, by street and action, as JSON next to the game log.
+        '''
+        filename = GAME_LOG_FILENAME + '_timing.json'
+        with open(filename, 'w') as report_file:
+            json.dump({player.name: player.timing_report() for player in players}, report_file, indent=1)
+        print('Writing', filename)
 
 
 if __name__ == '__main__':
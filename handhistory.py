@@ -0,0 +1,127 @@
+'''
+Reader for the binary hand history written by the engine when HAND_HISTORY is on.
+
+The .hands and .actions files are memory-mapped as NumPy structured arrays, so
+millions of rounds load instantly and can be sliced and aggregated without
+parsing gamelog.txt. The layout below is shared with the writer, HandHistory in
+engine.py.
+
+Usage: python3 handhistory.py [GAME_LOG_FILENAME]
+'''
+import struct
+import sys
+import numpy as np
+
+# Binary hand history layout, little endian:
+#
+# both files start with HISTORY_HEADER: magic, version, the two player names
+# .hands has one HAND_RECORD per round: round number, original index of the player in
+#   seat 0, hole cards per seat (3 slots each, 255 if empty), board, last street,
+#   showdown flag, bids per seat (-1 without auction), deltas per seat, index of the
+#   round's first action record and number of action records
+# .actions has one ACTION_RECORD per action: round number, street, seat, action code
+#   (FOLD to BID), amount for raises and bids
+# cards are encoded as rank * 4 + suit, ranks 2..A as 0..12 and suits c, d, h, s as 0..3
+HISTORY_VERSION = 1
+HISTORY_HEADER = struct.Struct('<4sH16s16s')
+HAND_RECORD = struct.Struct('<IB6B5BBB2h2hIH')
+ACTION_RECORD = struct.Struct('<IBBBxH')
+HAND_DTYPE = np.dtype([
+    ('round', '<u4'),
+    ('seat0', 'u1'),
+    ('hands', 'u1', (2, 3)),
+    ('board', 'u1', (5,)),
+    ('street', 'u1'),
+    ('showdown', 'u1'),
+    ('bids', '<i2', (2,)),
+    ('deltas', '<i2', (2,)),
+    ('first_action', '<u4'),
+    ('num_actions', '<u2'),
+])
+ACTION_DTYPE = np.dtype([
+    ('round', '<u4'),
+    ('street', 'u1'),
+    ('seat', 'u1'),
+    ('code', 'u1'),
+    ('pad', 'u1'),
+    ('amount', '<u2'),
+])
+FOLD, CALL, CHECK, RAISE, BID = range(5)
+NO_CARD = 255
+
+
+def read_header(path, magic):
+    '''
+    Checks a history file's header and returns the two player names.
+    '''
+    with open(path, 'rb') as history_file:
+        found, version, name0, name1 = HISTORY_HEADER.unpack(history_file.read(HISTORY_HEADER.size))
+    if found != magic or version != HISTORY_VERSION:
+        raise ValueError('{} is not a v{} hand history file'.format(path, HISTORY_VERSION))
+    return [name0.rstrip(b'\0').decode(), name1.rstrip(b'\0').decode()]
+
+
+def memmap(path, dtype):
+    '''
+    Maps the records of a history file, tolerating a file with no records yet.
+    '''
+    count = (np.memmap(path, dtype='u1', mode='r').size - HISTORY_HEADER.size) // dtype.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HISTORY_HEADER.size, shape=(count,))
+
+
+class HandHistory():
+    '''
+    One match's hand history as memory-mapped record arrays.
+    '''
+
+    def __init__(self, name):
+        '''
+        name: path of the history without extension, e.g. 'gamelog'.
+        '''
+        self.player_names = read_header(name + '.hands', b'PBHH')
+        read_header(name + '.actions', b'PBHA')
+        self.hands = memmap(name + '.hands', HAND_DTYPE)
+        self.actions = memmap(name + '.actions', ACTION_DTYPE)
+
+    def seat_of(self, player):
+        '''
+        Returns an array with the seat (0 or 1) the player sat in for every round.
+        '''
+        index = self.player_names.index(player)
+        return np.where(self.hands['seat0'] == index, 0, 1)
+
+    def deltas(self, player):
+        '''
+        Returns the player's bankroll delta for every round.
+        '''
+        seat = self.seat_of(player)
+        return self.hands['deltas'][np.arange(len(seat)), seat]
+
+    def bids(self, player):
+        '''
+        Returns (own bids, opponent bids) for every round with an auction.
+        '''
+        seat = self.seat_of(player)
+        rounds = np.nonzero(self.hands['bids'][:, 0] >= 0)[0]
+        bids = self.hands['bids'][rounds]
+        return bids[np.arange(len(rounds)), seat[rounds]], bids[np.arange(len(rounds)), 1 - seat[rounds]]
+
+    def round_actions(self, round_index):
+        '''
+        Returns the action records of one round, by position in self.hands.
+        '''
+        hand = self.hands[round_index]
+        return self.actions[hand['first_action']:hand['first_action'] + hand['num_actions']]
+
+
+if __name__ == '__main__':
+    history = HandHistory(sys.argv[1] if len(sys.argv) > 1 else 'gamelog')
+    showdowns = history.hands['showdown'] == 1
+    print('{} rounds, {} actions, {} showdowns'.format(len(history.hands), len(history.actions), showdowns.sum()))
+    for player in history.player_names:
+        own, opp = history.bids(player)
+        print('{}: bankroll {}, showdown delta {}, mean bid {:.1f} over {} auctions, won {} auctions'.format(
+            player, history.deltas(player).sum(), history.deltas(player)[showdowns].sum(),
+            own.mean() if len(own) else 0., len(own), (own > opp).sum()))
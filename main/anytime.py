@@ -0,0 +1,60 @@
+"""
+Anytime monte carlo estimation under the game clock.
+
+Estimators hand over a function that runs a chunk of trials; estimate() keeps
+calling it until the per-decision time budget is spent, the standard error is
+small enough, or the trial cap is reached. Postflop decisions go through it in
+OpponentRange.equity whenever the range is too wide to enumerate; preflop and
+auction decisions only do when their precomputed table is missing.
+"""
+from collections import namedtuple
+import time
+import numpy as np
+from skeleton.states import NUM_ROUNDS
+
+Estimate = namedtuple('Estimate', ['means', 'trials', 'stderr'])
+
+CHUNK = 250  # trials per batch, small enough to stop close to the budget
+TARGET_SE = 0.01  # stop once every probability is known to about +-2%
+DECISIONS_PER_ROUND = 4  # estimator calls in a typical round (auction + betting streets)
+CLOCK_RESERVE = 2.  # seconds kept back for parsing, acks and the rest of the bot
+
+
+def time_budget(game_clock, round_num, decisions_per_round=DECISIONS_PER_ROUND, reserve=CLOCK_RESERVE):
+    """
+    game_clock (float): seconds left on our clock
+    round_num (int): current round, starting at 1
+    decisions_per_round (int): expected number of estimates per round
+    reserve (float): seconds never handed out to estimators
+
+    Returns seconds one decision may spend estimating
+    """
+    rounds_left = max(NUM_ROUNDS - round_num + 1, 1)
+    return max(game_clock - reserve, 0.) / (rounds_left*decisions_per_round)
+
+
+def estimate(trials, max_trials, budget=None, target_se=TARGET_SE, chunk=CHUNK):
+    """
+    trials (function): trials(n) runs n trials and returns a tuple of boolean outcome arrays
+    max_trials (int): most trials to run
+    budget (float): seconds to spend, None runs max_trials in one batch
+    target_se (float): stop early once the largest standard error drops below this
+    chunk (int): trials per batch
+
+    Returns Estimate of the outcome probabilities, trials used and largest standard error
+    """
+    if budget is None:
+        chunk = max_trials
+    start = time.perf_counter()
+    sums = None
+    count = 0
+    while True:
+        size = min(chunk, max_trials-count)
+        outcomes = trials(size)
+        totals = np.array([outcome.sum() for outcome in outcomes], dtype=np.float64)
+        sums = totals if sums is None else sums+totals
+        count += size
+        means = sums/count
+        stderr = float(np.sqrt(means*(1-means)/count).max())
+        if count >= max_trials or stderr <= target_se or time.perf_counter()-start >= budget:
+            return Estimate(tuple(means), count, stderr)
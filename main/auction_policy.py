@@ -0,0 +1,75 @@
+"""
+Auction bid policy learned offline by self-play (see auction_selfplay.py).
+
+For every candidate bid, a fraction of the pot in ARMS, the policy holds a
+linear model of the payoff (in pots) given our auction features. Bidding is
+one small matrix product and an argmax. Self-play only plays the hand out by
+checking, so it cannot see what a bid costs in later betting; the arms stop at
+one pot until postflop betting is modelled.
+"""
+import os
+import numpy as np
+
+POLICY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'auction_policy.npz')
+POLICY_VERSION = 2
+ARMS = np.array([0., 0.1, 0.25, 0.4, 0.55, 0.7, 0.85, 1.])  # candidate bids as fractions of the pot, at most a pot
+NUM_FEATURES = 6
+
+
+def policy_features(p_tie, p_win, p_lose, pot, stack):
+    """
+    p_tie (float): probability of winning if the auction ties
+    p_win (float): probability of winning if we win the auction
+    p_lose (float): probability of winning if we lose the auction
+    pot (int): chips in the pot at the auction
+    stack (int): our chips behind
+
+    Returns the feature vector the payoff models are linear in
+    """
+    return np.array([1., p_tie, p_win, p_lose, (p_win - p_lose)**2, pot/max(pot + stack, 1)])
+
+
+class AuctionPolicy():
+    """
+    Per-arm linear payoff models, bids the arm with the best predicted payoff.
+    """
+
+    def __init__(self, weights, arms=ARMS):
+        """
+        weights (array): (NUM_FEATURES, len(arms)) payoff model coefficients
+        arms (array): candidate bids as fractions of the pot
+        """
+        self.weights = weights
+        self.arms = arms
+
+    @classmethod
+    def load(cls, path=POLICY_PATH):
+        """
+        path (str): .npz file written by save
+
+        Returns AuctionPolicy, raises OSError if missing and ValueError on a malformed or outdated file
+        """
+        with np.load(path) as arrays:
+            if int(arrays['version']) != POLICY_VERSION or arrays['weights'].shape != (NUM_FEATURES, len(arrays['arms'])):
+                raise ValueError('unsupported auction policy')
+            return cls(arrays['weights'], arrays['arms'])
+
+    def save(self, path=POLICY_PATH, **metadata):
+        """
+        path (str): .npz file to write
+        metadata (dict): extra arrays stored alongside, e.g. how many auctions were simulated
+
+        Returns None
+        """
+        np.savez(path, version=np.array(POLICY_VERSION), weights=self.weights, arms=self.arms, **metadata)
+
+    def bid(self, features, pot, max_bid):
+        """
+        features (array): policy_features of the current auction
+        pot (int): chips in the pot at the auction
+        max_bid (int): largest bid we are willing or allowed to make
+
+        Returns the bid in chips
+        """
+        arm = int(np.argmax(features @ self.weights))
+        return max(min(int(self.arms[arm]*pot), max_bid), 0)
@@ -0,0 +1,184 @@
+"""
+NumPy batch hand evaluator.
+
+Cards are uint8 codes rank*4 + suit (rank 2=0 .. A=12, suit c,d,h,s), the same
+order as eval7.Deck(). evaluate() ranks thousands of 5-8 card hands per call and
+returns int32 scores that compare the same way eval7.evaluate does: larger is
+better, equal means a split pot.
+
+Score layout: category << 20 followed by up to five 4-bit ranks, most
+significant first. Categories run from high card (0) to straight flush (8).
+"""
+import functools
+import itertools
+import numpy as np
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+DECK = np.arange(52, dtype=np.uint8)
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+
+
+def encode(cards):
+    """
+    cards (list): cards in common format, e.g. ['Ah', 'Td']
+
+    Returns uint8 array of card codes
+    """
+    return np.array([RANKS.index(card[0])*4 + SUITS.index(card[1]) for card in cards], dtype=np.uint8)
+
+
+def decode(codes):
+    """
+    codes (array): card codes
+
+    Returns list of cards in common format
+    """
+    return [RANKS[code >> 2] + SUITS[code & 3] for code in codes]
+
+
+def _build_tables():
+    """
+    Precomputes per 13-bit rank mask lookups used by evaluate.
+
+    Returns (popcount, highest rank, top 5 ranks packed, straight high card or -1)
+    """
+    masks = np.arange(1 << 13)
+    bits = (masks[:, None] >> np.arange(13)) & 1
+    popcount = bits.sum(axis=1).astype(np.int32)
+    # ranks present, highest first, padded with -1
+    ordered = np.where(bits[:, ::-1] == 1, np.arange(12, -1, -1), -1)
+    ordered = -np.sort(-ordered, axis=1)
+    high = ordered[:, 0].astype(np.int32)
+    top = np.zeros(1 << 13, dtype=np.int32)
+    for slot in range(5):
+        top |= np.maximum(ordered[:, slot], 0).astype(np.int32) << (4*(4-slot))
+    straight = np.full(1 << 13, -1, dtype=np.int32)
+    for high_card in range(3, 13):
+        run = 0
+        for rank in range(high_card-4, high_card+1):
+            run |= 1 << (rank % 13)  # rank -1 is the ace in the wheel
+        straight[(masks & run) == run] = high_card
+    return popcount, high, top, straight
+
+
+POPCOUNT, HIGHEST, TOP5, STRAIGHT_HIGH = _build_tables()
+# one bit per card, laid out as four 13-bit suit masks
+CARD_BITS = np.array([1 << ((code & 3)*13 + (code >> 2)) for code in range(52)], dtype=np.int64)
+
+
+def _top(mask, count):
+    """
+    Packs the `count` highest ranks of each mask into the low 4*count bits.
+    """
+    return TOP5[mask] >> (4*(5-count))
+
+
+def evaluate(hands):
+    """
+    hands (array): (n, k) card codes with 5 <= k <= 8
+
+    Returns (n,) int32 array of hand scores
+    """
+    hands = np.asarray(hands, dtype=np.intp)
+    n = hands.shape[0]
+    cards = CARD_BITS[hands[:, 0]]
+    for column in range(1, hands.shape[1]):
+        cards = cards | CARD_BITS[hands[:, column]]
+    c, d, h, s = [((cards >> (13*suit)) & 0x1FFF).astype(np.int32) for suit in range(4)]
+    any_mask = c | d | h | s
+    pair_mask = (c & d) | (c & h) | (c & s) | (d & h) | (d & s) | (h & s)
+    trip_mask = (c & d & h) | (c & d & s) | (c & h & s) | (d & h & s)
+    quad_mask = c & d & h & s
+    suit_masks = np.stack([c, d, h, s], axis=1)
+    suit_counts = POPCOUNT[suit_masks]
+    # at most one suit can hold five of eight cards
+    flush_suit = suit_counts.argmax(axis=1)
+    flush_mask = np.where(suit_counts.max(axis=1) >= 5, suit_masks[np.arange(n), flush_suit], 0)
+
+    straight_flush = STRAIGHT_HIGH[flush_mask]
+    straight = STRAIGHT_HIGH[any_mask]
+    quad = HIGHEST[quad_mask]
+    trip = HIGHEST[trip_mask]
+    pair = HIGHEST[pair_mask]
+    trip_bit = np.where(trip >= 0, 1 << np.maximum(trip, 0), 0)
+    full_pair = HIGHEST[pair_mask & ~trip_bit]
+    second_pair = HIGHEST[pair_mask & ~(1 << np.maximum(pair, 0))]
+    pair_bits = (1 << np.maximum(pair, 0)) | (1 << np.maximum(second_pair, 0))
+
+    conditions = [
+        straight_flush >= 0,
+        quad >= 0,
+        (trip >= 0) & (full_pair >= 0),
+        flush_mask > 0,
+        straight >= 0,
+        trip >= 0,
+        second_pair >= 0,
+        pair >= 0,
+    ]
+    choices = [
+        (STRAIGHT_FLUSH << 20) | (straight_flush << 16),
+        (QUADS << 20) | (quad << 16) | (_top(any_mask & ~(1 << np.maximum(quad, 0)), 1) << 12),
+        (FULL_HOUSE << 20) | (trip << 16) | (full_pair << 12),
+        (FLUSH << 20) | TOP5[flush_mask],
+        (STRAIGHT << 20) | (straight << 16),
+        (TRIPS << 20) | (trip << 16) | (_top(any_mask & ~trip_bit, 2) << 8),
+        (TWO_PAIR << 20) | (pair << 16) | (second_pair << 12) | (_top(any_mask & ~pair_bits, 1) << 8),
+        (PAIR << 20) | (pair << 16) | (_top(any_mask & ~(1 << np.maximum(pair, 0)), 3) << 4),
+    ]
+    return np.select(conditions, choices, default=TOP5[any_mask]).astype(np.int32)
+
+
+def sample(deck, trials, count, rng):
+    """
+    deck (array): card codes still available
+    trials (int): number of independent draws
+    count (int): cards drawn per trial
+    rng (Generator): numpy random generator
+
+    Returns (trials, count) array, each row a uniformly random draw without replacement
+    """
+    order = rng.random((trials, len(deck))).argsort(axis=1)[:, :count]
+    return deck[order]
+
+
+@functools.lru_cache(maxsize=None)
+def _runout_index(deck_size, board):
+    """
+    Positions into a deck of deck_size cards for every runout of board cards.
+    """
+    combos = list(itertools.combinations(range(deck_size), board))
+    return np.array(combos, dtype=np.intp).reshape(len(combos), board)
+
+
+def enumerate_runouts(deck, board):
+    """
+    deck (array): card codes still available
+    board (int): board cards left to come
+
+    Returns card code array with every runout exactly once, a single empty runout if board is 0
+    """
+    return deck[_runout_index(len(deck), board)]
+
+
+def remaining(*hands):
+    """
+    hands (list): lists of cards in common format that are no longer in the deck
+
+    Returns card codes of the remaining deck
+    """
+    dead = np.zeros(52, dtype=bool)
+    for cards in hands:
+        dead[encode(cards)] = True
+    return DECK[~dead]
+
+
+def combine(fixed, *drawn):
+    """
+    fixed (array): card codes shared by every trial
+    drawn (array): (n, k) per-trial card codes, any number of them
+
+    Returns (n, len(fixed) + sum of k) array of full hands
+    """
+    trials = drawn[0].shape[0]
+    return np.hstack([np.broadcast_to(fixed, (trials, len(fixed)))] + list(drawn))
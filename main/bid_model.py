@@ -0,0 +1,64 @@
+"""
+Online model of the opponent's auction bid.
+
+Recursive least squares with exponential forgetting: every finished auction
+updates a linear fit of the opponent's bid on our auction features in O(1),
+so the model is usable after a few dozen auctions and keeps tracking an
+opponent who changes their bidding during the match.
+"""
+import numpy as np
+
+NUM_FEATURES = 4  # p_win2, p_win3, total preflop raise, opponent preflop raise
+FORGETTING = 0.995  # weight kept by each older auction per new one, ~200 auctions of memory
+PRIOR = 1000.  # initial inverse covariance scale, large means trust the data quickly
+MIN_AUCTIONS = 30  # observations before predictions are used
+
+
+class OnlineBidModel():
+    """
+    Recursive least squares fit of opp_bid ~ features . weights + bias.
+    """
+
+    def __init__(self, num_features=NUM_FEATURES, forgetting=FORGETTING, prior=PRIOR):
+        """
+        num_features (int): features per auction
+        forgetting (float): factor in (0, 1] older observations are discounted by per update
+        prior (float): scale of the initial inverse covariance
+        """
+        self.forgetting = forgetting
+        self.weights = np.zeros(num_features+1)
+        self.inverse = np.eye(num_features+1)*prior
+        self.x = np.ones(num_features+1)  # reused input row, the last entry is the bias term
+        self.count = 0  # auctions seen
+
+    def update(self, features, bid):
+        """
+        features (list): our features for one auction
+        bid (int): the opponent's bid in that auction
+
+        Returns None
+        """
+        x = self.x
+        x[:-1] = features
+        inverse_x = self.inverse @ x
+        gain = inverse_x/(self.forgetting + x @ inverse_x)
+        self.weights += gain*(bid - x @ self.weights)
+        self.inverse -= np.outer(gain, inverse_x)
+        self.inverse /= self.forgetting
+        self.count += 1
+
+    def ready(self):
+        """
+        Returns whether enough auctions were seen to trust predictions
+        """
+        return self.count >= MIN_AUCTIONS
+
+    def predict(self, features):
+        """
+        features (list): our features for the current auction
+
+        Returns the predicted opponent bid
+        """
+        x = self.x
+        x[:-1] = features
+        return float(x @ self.weights)
@@ -0,0 +1,102 @@
+"""
+Bounded LRU cache for equity estimates.
+
+Situations are keyed up to suit isomorphism: relabelling the suits of hand and
+board together never changes an equity, so AhKh on Qh7c2d shares an entry with
+AsKs on Qs7d2c. Cards inside the hand and inside the board are unordered.
+
+With the preflop and auction tables shipped, only the Monte Carlo fallbacks that
+run when a table is missing use the cache; postflop range equity depends on the
+opponent's range as well as the cards and is never cached.
+"""
+from collections import OrderedDict
+from itertools import permutations
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+SUIT_PERMUTATIONS = list(permutations(range(4)))
+CACHE_SIZE = 4096
+
+
+def canonical(hand, board):
+    """
+    hand (list): your cards
+    board (list): cards on the board
+
+    Returns (hand codes, board codes), the smallest relabelling over all 24 suit permutations
+    """
+    hand = [(RANKS.index(card[0]), SUITS.index(card[1])) for card in hand]
+    board = [(RANKS.index(card[0]), SUITS.index(card[1])) for card in board]
+    best = None
+    for perm in SUIT_PERMUTATIONS:
+        key = (tuple(sorted(rank*4 + perm[suit] for rank, suit in hand)),
+               tuple(sorted(rank*4 + perm[suit] for rank, suit in board)))
+        if best is None or key < best:
+            best = key
+    return best
+
+
+class EquityCache():
+    """
+    Least recently used map from situation keys to estimates.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        """
+        maxsize (int): most entries kept before the least recently used is evicted, 0 disables caching
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(kind, hand, board, opp=2):
+        """
+        kind (str): which estimator, e.g. 'round' or 'auction'
+        hand (list): your cards
+        board (list): cards on the board
+        opp (int): number of cards your opponent has
+
+        Returns hashable key shared by every suit-isomorphic situation
+        """
+        return (kind, opp) + canonical(hand, board)
+
+    def get(self, key):
+        """
+        key (tuple): from EquityCache.key
+
+        Returns the cached value or None
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        key (tuple): from EquityCache.key
+        value (obj): estimate to store
+
+        Returns None
+        """
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns a one-line summary of hits, misses and evictions, printed by benchmark.py run --cache
+        """
+        lookups = self.hits + self.misses
+        rate = self.hits/lookups if lookups else 0.
+        return 'equity cache: {} hits, {} misses ({:.1%} hit rate), {} evictions, {} entries'.format(
+            self.hits, self.misses, rate, self.evictions, len(self.entries))
@@ -0,0 +1,253 @@
+"""
+Opponent statistics with fixed-size NumPy counters.
+
+Every finished round is summarized as one row of counters (VPIP, PFR, folds at the
+first preflop decision, actions and folds to bets per street, a bid histogram and
+showdown hand categories). The row
+is added to three views of the match at once:
+    total    every round so far
+    decayed  exponentially decayed, each round keeps DECAY of the weight before it
+    window   the last WINDOW rounds, kept in a ring buffer
+Recording a round and reading any statistic touch a fixed number of entries, so
+both are O(1) no matter how long the match has run.
+"""
+import numpy as np
+from skeleton.actions import CallAction, CheckAction, RaiseAction
+from skeleton.roundlog import STREETS, actions_since
+from skeleton.states import STARTING_STACK
+import batch_eval
+
+DECAY = 0.99  # weight kept by each older round per new one, ~100 rounds of memory
+WINDOW = 100  # rounds in the sliding window
+BID_BIN_WIDTH = 25  # chips per bid histogram bin
+NUM_BID_BINS = STARTING_STACK//BID_BIN_WIDTH + 1  # the last bin holds all-in bids
+NUM_CATEGORIES = 9  # hand categories, high card to straight flush
+STREET_COUNTERS = ['acted', 'bets_faced', 'folds', 'checks', 'calls', 'raises']
+
+# layout of a counter row
+ROUNDS, VPIP, PFR, FIRST_FOLDS, AUCTIONS, SHOWDOWNS = range(6)
+STREET_BASE = 6
+BID_BASE = STREET_BASE + len(STREETS)*len(STREET_COUNTERS)
+CATEGORY_BASE = BID_BASE + NUM_BID_BINS
+NUM_COUNTERS = CATEGORY_BASE + NUM_CATEGORIES
+VIEWS = ['total', 'decayed', 'window']
+
+
+def street_counter(street, name):
+    """
+    street (int): 0, 3, 4 or 5
+    name (str): one of STREET_COUNTERS
+
+    Returns the counter's index in a row
+    """
+    return STREET_BASE + STREETS.index(street)*len(STREET_COUNTERS) + STREET_COUNTERS.index(name)
+
+
+class OpponentStats():
+    """
+    Counters of the opponent's behaviour over the match.
+    """
+
+    def __init__(self, decay=DECAY, window=WINDOW):
+        """
+        decay (float): factor in (0, 1] older rounds are discounted by per round in the decayed view
+        window (int): rounds in the sliding window view
+        """
+        self.decay = decay
+        self.views = {view: np.zeros(NUM_COUNTERS) for view in VIEWS}
+        self.recent = np.zeros((window, NUM_COUNTERS))  # ring buffer of the window's rows
+        self.position = 0
+        self.row = np.zeros(NUM_COUNTERS)  # reused for the round being recorded
+
+    def record_round(self, terminal_state, active):
+        """
+        terminal_state (TerminalState): how the round ended
+        active (int): your player's index
+
+        Returns None
+        """
+        row = self.row
+        row[:] = 0
+        row[ROUNDS] = 1
+        opp = 1 - active
+        final_state = terminal_state.previous_state
+        acted = set()
+        for state, action in actions_since(final_state):
+            if state.button % 2 == opp and not state.auction:
+                self.count_action(state, action, acted)
+        if final_state.pips[0] != final_state.pips[1] and final_state.button % 2 == opp:
+            # the round ended with the opponent folding to a bet
+            row[street_counter(final_state.street, 'folds')] += 1
+            if final_state.street == 0 and final_state.button < 2:  # before the opponent's first preflop action
+                row[FIRST_FOLDS] = 1
+            self.count_action(final_state, None, acted)
+        if None not in terminal_state.bids:
+            row[AUCTIONS] = 1
+            row[BID_BASE + min(terminal_state.bids[opp]//BID_BIN_WIDTH, NUM_BID_BINS - 1)] = 1
+        board = final_state.deck[:5]
+        if final_state.hands[opp] and len(board) == 5:
+            category = int(batch_eval.evaluate(batch_eval.encode(final_state.hands[opp] + board)[None])[0]) >> 20
+            row[SHOWDOWNS] = 1
+            row[CATEGORY_BASE + category] = 1
+        self.add(row)
+
+    def count_action(self, state, action, acted):
+        """
+        state (RoundState): the state the opponent acted from
+        action (Action): what they did, None for a fold
+        acted (set): streets the opponent has acted on this round, updated
+
+        Returns None
+        """
+        row = self.row
+        street = state.street
+        opp = state.button % 2
+        if street not in acted:
+            acted.add(street)
+            row[street_counter(street, 'acted')] = 1
+        if state.pips[1-opp] > state.pips[opp]:
+            row[street_counter(street, 'bets_faced')] += 1
+        if isinstance(action, RaiseAction):
+            row[street_counter(street, 'raises')] += 1
+            if street == 0:
+                row[VPIP] = row[PFR] = 1
+        elif isinstance(action, CallAction):
+            row[street_counter(street, 'calls')] += 1
+            if street == 0:
+                row[VPIP] = 1
+        elif isinstance(action, CheckAction):
+            row[street_counter(street, 'checks')] += 1
+
+    def add(self, row):
+        """
+        row (array): counters of one round
+
+        Returns None, updates every view
+        """
+        self.views['total'] += row
+        decayed = self.views['decayed']
+        decayed *= self.decay
+        decayed += row
+        window = self.views['window']
+        window -= self.recent[self.position]
+        window += row
+        self.recent[self.position] = row
+        self.position = (self.position + 1) % len(self.recent)
+
+    def rate(self, numerator, denominator, view='total'):
+        """
+        numerator (int): counter index
+        denominator (int): counter index
+        view (str): 'total', 'decayed' or 'window'
+
+        Returns numerator/denominator in that view, 0 before the denominator is ever counted
+        """
+        counts = self.views[view]
+        return counts[numerator]/counts[denominator] if counts[denominator] > 0 else 0.
+
+    def rounds(self, view='total'):
+        """
+        Returns the number of rounds counted in the view, prior rounds from profiles included
+        """
+        return float(self.views[view][ROUNDS])
+
+    def vpip(self, view='total'):
+        """
+        Returns how often the opponent voluntarily put chips in preflop when they got to act
+        """
+        return self.rate(VPIP, street_counter(0, 'acted'), view)
+
+    def pfr(self, view='total'):
+        """
+        Returns how often the opponent raised preflop when they got to act
+        """
+        return self.rate(PFR, street_counter(0, 'acted'), view)
+
+    def fold_rate(self, street, view='total'):
+        """
+        street (int): 0, 3, 4 or 5
+
+        Returns how often the opponent folded on a street they acted on
+        """
+        return self.rate(street_counter(street, 'folds'), street_counter(street, 'acted'), view)
+
+    def first_fold_rate(self, view='total'):
+        """
+        Returns how often the opponent folded at their first preflop decision, when they got one
+        """
+        return self.rate(FIRST_FOLDS, street_counter(0, 'acted'), view)
+
+    def fold_to_bet(self, street, view='total'):
+        """
+        street (int): 0, 3, 4 or 5
+
+        Returns how often the opponent folded when facing a bet or raise on the street
+        """
+        return self.rate(street_counter(street, 'folds'), street_counter(street, 'bets_faced'), view)
+
+    def aggression(self, street, view='total'):
+        """
+        street (int): 0, 3, 4 or 5
+
+        Returns the fraction of the opponent's actions on the street that were raises
+        """
+        counts = self.views[view]
+        start = street_counter(street, 'folds')
+        actions = counts[start:start + 4].sum()  # folds, checks, calls and raises
+        return counts[street_counter(street, 'raises')]/actions if actions > 0 else 0.
+
+    def bid_distribution(self, view='total'):
+        """
+        Returns the fraction of the opponent's bids in each BID_BIN_WIDTH chip bin
+        """
+        counts = self.views[view]
+        return counts[BID_BASE:CATEGORY_BASE]/max(counts[AUCTIONS], 1e-12)
+
+    def showdown_categories(self, view='total'):
+        """
+        Returns the fraction of the opponent's showdown hands in each category, high card first
+        """
+        counts = self.views[view]
+        return counts[CATEGORY_BASE:]/max(counts[SHOWDOWNS], 1e-12)
+
+    def fingerprint(self, view='window'):
+        """
+        view (str): 'total', 'decayed' or 'window'
+
+        Returns a vector of the opponent's style to tell opponents apart, every entry in [0, 1]
+        """
+        centers = (np.arange(NUM_BID_BINS) + 0.5)*BID_BIN_WIDTH/STARTING_STACK
+        return np.array([self.vpip(view), self.pfr(view), self.fold_to_bet(0, view)]
+                        + [self.aggression(street, view) for street in STREETS]
+                        + [min(self.bid_distribution(view) @ centers, 1.)])
+
+    def rows(self):
+        """
+        Returns the rows in the sliding window, oldest first
+        """
+        count = int(round(self.views['window'][ROUNDS]))
+        return np.roll(self.recent, -self.position, axis=0)[len(self.recent) - count:]
+
+    def state(self):
+        """
+        Returns the total and decayed views as a dict of arrays, see load_state
+        """
+        return {'total': self.views['total'], 'decayed': self.views['decayed']}
+
+    def load_state(self, arrays):
+        """
+        arrays (dict): arrays from state(), e.g. read back from an opponent profile
+
+        Returns None, continues the total and decayed views from them, the window starts empty
+        """
+        self.views['total'][:] = arrays['total']
+        self.views['decayed'][:] = arrays['decayed']
+
+    def stats(self):
+        """
+        Returns a one-line summary of the match so far
+        """
+        return 'opponent: vpip {:.2f}, pfr {:.2f}, fold to bet {}, aggression {}, {} showdowns'.format(
+            self.vpip(), self.pfr(), '/'.join('{:.2f}'.format(self.fold_to_bet(street)) for street in STREETS),
+            '/'.join('{:.2f}'.format(self.aggression(street)) for street in STREETS),
+            int(self.views['total'][SHOWDOWNS]))
@@ -6,11 +6,23 @@ from skeleton.states import GameState, TerminalState, RoundState
 from skeleton.states import NUM_ROUNDS, STARTING_STACK, BIG_BLIND, SMALL_BLIND
 from skeleton.bot import Bot
 from skeleton.runner import parse_args, run_bot
+from preflop_table import PreflopTable
+from auction_table import AuctionTable, auction_trials
+from bid_model import OnlineBidModel
+from auction_policy import AuctionPolicy, policy_features
+from ranges import OpponentRange, preflop_strength
+from profiles import ProfileStore, FINGERPRINT_ROUNDS, SAVE_EVERY, configured_directory, new_profile_id
+import os
 import random
-import eval7
-import torch
-from torch import nn
-from torch import optim
+import threading
+import numpy as np
+import batch_eval
+import anytime
+from equity_cache import EquityCache, CACHE_SIZE
+
+MAX_TRIALS = 20000  # cap on monte carlo trials per equity estimate
+SEED_VARIABLE = 'POKERBOT_SEED'  # match seed set by tournament.py, unset in real matches
+
 
 class Player(Bot):
     """
@@ -23,25 +35,35 @@ class Player(Bot):
 
         Returns None
         """
+        seed = os.environ.get(SEED_VARIABLE)
+        self.rng = np.random.default_rng(None if seed is None else int(seed))
+        self.estimate = None  # anytime.Estimate from the latest equity calculation
+        self.equity_cache = EquityCache(CACHE_SIZE)  # fallback only: serves the Monte Carlo paths used when a table is missing
+
         # my stats
         self.folds = 0
         self.preflops = 0
         self.cutoff = 0.575
+        try:
+            self.preflop_table = PreflopTable.load()
+        except (OSError, ValueError):
+            print('preflop table unavailable, falling back to monte carlo')
+            self.preflop_table = None
+        self.auction_table = None  # decompressed in the background once connected, monte carlo until then
+        self.table_loader = None
+        try:
+            self.auction_policy = AuctionPolicy.load()
+        except (OSError, ValueError):
+            self.auction_policy = None  # bid with the hand-tuned rules, train it with auction_selfplay.py
+        self.preflop_strength = preflop_strength(self.preflop_table)  # percentile of every starting hand
 
         # opp stats
-        self.opp_folds = 0
-        self.opp_preflops = 0
-        self.opp_bids = []
-        self.my_pwins2 = []
-        self.my_pwins3 = []
-        self.preflop_raises = []
-        self.opp_raises = []
-        self.auction_model = nn.Sequential(
-            nn.Linear(4,8),
-            nn.ReLU(),
-            nn.Linear(8,1),
-            nn.ReLU()
-        )
+        # predicts the opponent's bid for the hand-tuned rules, the learned policy does without it
+        self.bid_model = OnlineBidModel() if self.auction_policy is None else None
+        # start from a prior pooled across stored profiles, the opponent's own is picked after FINGERPRINT_ROUNDS
+        self.profiles = ProfileStore(configured_directory())
+        self.opp_stats = self.profiles.prior()
+        self.profile_id = None
 
 
     def handle_new_round(self, game_state, round_state, active):
@@ -55,8 +77,11 @@ class Player(Bot):
         Returns None
         """
         # print(f'---round {game_state.round_num}---')
-        self.folded = False
-        self.opp_preflop_opportunity = True
+        if self.table_loader is None:
+            # we are connected now, so decompressing the table can no longer delay the connection
+            self.table_loader = threading.Thread(target=self.load_auction_table, daemon=True)
+            self.table_loader.start()
+        self.opp_range = OpponentRange(round_state.hands[active], self.preflop_strength)
 
 
     def handle_round_over(self, game_state, terminal_state, active):
@@ -70,49 +95,69 @@ class Player(Bot):
         Returns None
         """
         previous_state = terminal_state.previous_state  # RoundState before payoffs
+        self.opp_stats.record_round(terminal_state, active)
         
         # preflop folding stats
         if game_state.round_num == NUM_ROUNDS:
             print(f'proportion preflop folds: {self.folds/self.preflops}')
-            print(f'opponents fold rate: {self.opp_folds/self.opp_preflops}')
-        if self.opp_preflop_opportunity:
-            self.opp_preflops += 1
-            if previous_state.street==0 and previous_state.button in [0,1] and not self.folded:
-                self.opp_folds += 1
+            print(f'opponents fold rate: {self.opp_stats.first_fold_rate()}')
+            print(self.opp_stats.stats())
 
         # auction model
-        if terminal_state.bids != [None,None]:
-            self.my_pwins2.append(self.p_win2)
-            self.my_pwins3.append(self.p_win3)
-            self.opp_bids.append(terminal_state.bids[1-active])
+        if terminal_state.bids != [None,None] and self.bid_model is not None:
             total_raise,opp_raise = self.get_preflop_raises(previous_state,active)
-            self.preflop_raises.append(total_raise)
-            self.opp_raises.append(opp_raise)
-        if game_state.round_num == 0.75*NUM_ROUNDS:
-            # print(f'training auction model, {self.auction_model}')
-            self.train_auction_model()
+            self.bid_model.update([self.p_win2,self.p_win3,total_raise,opp_raise], terminal_state.bids[1-active])
+
+        # opponent profile
+        if game_state.round_num == FINGERPRINT_ROUNDS and self.profiles.directory is not None:
+            profile_id = self.profiles.match(self.opp_stats.fingerprint())
+            self.opp_stats = self.profiles.rebuild(profile_id, self.opp_stats)
+            self.profile_id = profile_id or new_profile_id()
+            print(f'opponent profile {self.profile_id} ({"known" if profile_id else "new"})')
+        if self.profile_id is not None and (game_state.round_num % SAVE_EVERY == 0 or game_state.round_num == NUM_ROUNDS):
+            try:
+                self.profiles.save(self.profile_id, self.opp_stats)
+            except OSError:
+                pass
 
     
-    def preflop_estimate(self, hand, iters):
+    def load_auction_table(self):
+        """
+        Loads the auction equity table, swapping it in with a single assignment.
+
+        Returns None
+        """
+        try:
+            self.auction_table = AuctionTable.load()
+        except (OSError, ValueError):
+            print('auction table unavailable, falling back to monte carlo')  # rebuild it with auction_table.py
+
+
+    def preflop_estimate(self, hand, iters, budget=None):
         """
         hand (list): two cards
-        iters (int): number of monte carlo iterations
+        iters (int): most monte carlo iterations, only used without a preflop table
+        budget (float): seconds to spend, None runs all iters
 
         Returns probability of winning given info so far
         """
-        deck = eval7.Deck()
-        my_cards = [eval7.Card(card) for card in hand]
-        for card in my_cards:
-            deck.cards.remove(card)
-        wins = 0
-
-        for i in range(iters):
-            deck.shuffle()
-            board_cards = deck[:5]
-            opp_cards = deck[5:7]
-            if eval7.evaluate(my_cards+board_cards) > eval7.evaluate(opp_cards+board_cards):
-                wins += 1
-        return wins/iters
+        if self.preflop_table is not None:
+            return self.preflop_table.lookup(hand)
+        key = self.equity_cache.key('preflop', hand, [])
+        self.estimate = self.equity_cache.get(key)
+        if self.estimate is not None:
+            return self.estimate.means[0]
+        deck = batch_eval.remaining(hand)
+        my_cards = batch_eval.encode(hand)
+
+        def trials(n):
+            drawn = batch_eval.sample(deck, n, 7, self.rng)
+            board_cards, opp_cards = drawn[:, :5], drawn[:, 5:]
+            return (batch_eval.evaluate(batch_eval.combine(my_cards, board_cards)) > batch_eval.evaluate(np.hstack([opp_cards, board_cards])),)
+
+        self.estimate = anytime.estimate(trials, iters, budget)
+        self.equity_cache.put(key, self.estimate)
+        return self.estimate.means[0]
     
 
     def get_preflop_raises(self,game_state,active):
@@ -122,6 +167,9 @@ class Player(Bot):
 
         Returns (total amount raised preflop, amount raised by opponent)
         """
+        if self.round_log is not None:
+            return self.round_log.preflop_raises(active)
+        # states not built by the Runner, e.g. replayed by benchmark.py
         curr = game_state
         opp_raise = 0
         while curr.street>0:
@@ -134,11 +182,12 @@ class Player(Bot):
         return total_raise, opp_raise
 
 
-    def auction_estimate(self, hand, flop, iters):
+    def auction_estimate(self, hand, flop, iters, budget=None):
         """
         hand (list): your cards (length 2)
         flop (list): cards on the board (length 3)
-        iters (int): number of monte carlo iterations
+        iters (int): most monte carlo iterations
+        budget (float): seconds to spend, None runs all iters
 
         Returns (
             probability of winning if we tie the auction (same method as preflop_estimate),
@@ -146,83 +195,32 @@ class Player(Bot):
             probability of winning if we lose the auction
             )
         """
-        deck = eval7.Deck()
-        my_cards = [eval7.Card(card) for card in hand]
-        flop_cards = [eval7.Card(card) for card in flop]
-        for card in my_cards+flop_cards:
-            deck.cards.remove(card)
-        wins,wins3,wins2 = 0,0,0
-
-        for i in range(iters):
-            deck.shuffle()
-            unflipped_cards = deck[0:2]
-            auction = deck[2]
-            opp_cards = deck[3:5]
-            val2 = eval7.evaluate(my_cards+flop_cards+unflipped_cards)
-            val3 = eval7.evaluate(my_cards+flop_cards+unflipped_cards+[auction])
-            opp2 = eval7.evaluate(opp_cards+flop_cards+unflipped_cards)
-            opp3 = eval7.evaluate(opp_cards+flop_cards+unflipped_cards+[auction])
-            if val3 > opp2: # we win auction
-                wins3 += 1
-            if val2 > opp3: # we lose auction
-                wins2 += 1
-            if val2 > opp2: # as in preflop_estimate, proxy for a tie in the auction (which would be val3 > opp3)
-                wins += 1
-        return wins/iters, wins3/iters, wins2/iters
+        if self.auction_table is not None:
+            equities = self.auction_table.lookup(hand, flop)
+            if equities is not None:
+                iters = self.auction_table.iters
+                self.estimate = anytime.Estimate(equities, iters, max(np.sqrt(p*(1-p)/iters) for p in equities))
+                return equities
+        key = self.equity_cache.key('auction', hand, flop)
+        self.estimate = self.equity_cache.get(key)
+        if self.estimate is not None:
+            return self.estimate.means
+        trials = auction_trials(hand, flop, self.rng)
+        self.estimate = anytime.estimate(trials, iters, budget)
+        self.equity_cache.put(key, self.estimate)
+        return self.estimate.means
     
 
-    def train_auction_model(self):
-        """
-        Trains self.auction_model for use in the rest of the game
-
-        Returns None
-        """
-        x,y = torch.tensor([self.my_pwins2,self.my_pwins3,self.preflop_raises,self.opp_raises]).T, torch.tensor(self.opp_bids)
-        optimizer = optim.SGD(self.auction_model.parameters(), lr=0.01)
-        for epoch in range(10):
-            yhat = self.auction_model(x)
-            loss = self.auction_loss(yhat, y)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-            print(f'Epoch {epoch}, Loss: {loss.item()}')
-
-
-    def auction_loss(self,yhat,y):
-        return torch.abs(torch.sub(yhat,y)).sum()
-        
-
-    def round_estimate(self, hand, opp, board, iters):
+    def range_estimate(self, hand, board, budget=None):
         """
         hand (list): your cards (length 2 or 3)
-        opp (int): number of cards your opponnet has (2 or 3)
         board (list): cards on the board (length 3, 4, or 5)
-        iters (int): number of monte carlo iterations
+        budget (float): seconds to spend, None samples up to ranges.WORK_LIMIT pairs
 
-        Return (probability of winning, probability of losing) given the current information
+        Returns (probability of winning, probability of losing) against the opponent's weighted range
         """
-        deck = eval7.Deck()
-        my_cards = [eval7.Card(card) for card in hand]
-        flipped_cards = [eval7.Card(card) for card in board]
-        for card in my_cards+flipped_cards:
-            deck.cards.remove(card)
-        unflipped = 5-len(board)
-        wins,losses,ties = 0,0,0
-
-        for i in range(iters):
-            deck.shuffle()
-            board_cards = flipped_cards + deck[:unflipped]
-            opp_cards = deck[unflipped:unflipped+2] if opp==2 else deck[unflipped:unflipped+3]
-            my_val = eval7.evaluate(my_cards+board_cards)
-            opp_val = eval7.evaluate(opp_cards+board_cards)
-            if my_val > opp_val:
-                wins +=1
-            elif my_val < opp_val:
-                losses += 1
-            else:
-                ties += 1
-
-        return wins/iters,losses/iters
+        self.estimate = self.opp_range.equity(hand, board, self.rng, budget)
+        return self.estimate.means
     
 
     def get_action(self, game_state, round_state, active):
@@ -252,6 +250,7 @@ class Player(Bot):
         my_contribution = STARTING_STACK - my_stack  # the number of chips you have contributed to the pot
         opp_contribution = STARTING_STACK - opp_stack  # the number of chips your opponent has contributed to the pot
         effective_stack = min(my_stack, opp_stack)
+        budget = anytime.time_budget(game_state.game_clock, game_state.round_num) # seconds for any equity estimate
 
         if RaiseAction in legal_actions:
             min_raise, max_raise = round_state.raise_bounds() # the smallest and largest numbers of chips for a legal bet/raise
@@ -261,17 +260,15 @@ class Player(Bot):
             if round_state.button in [0,1]:
                 if FoldAction in legal_actions:
                     self.preflops += 1
-                self.p_win = self.preflop_estimate(my_cards, 150)
-                if game_state.round_num > 200:
-                    if self.opp_folds/self.opp_preflops > self.folds/self.preflops and self.cutoff < 0.9:
+                self.p_win = self.preflop_estimate(my_cards, MAX_TRIALS, budget)
+                # a pooled or matched profile counts as rounds seen, so it opens this before round 200
+                if self.opp_stats.rounds() >= 200 and self.preflops >= 50:
+                    if self.opp_stats.first_fold_rate() > self.folds/self.preflops and self.cutoff < 0.9:
                         self.cutoff += 0.01
                     elif self.cutoff > 0.55:
                         self.cutoff -= 0.01
                 if self.p_win < self.cutoff and FoldAction in legal_actions:
-                    if round_state.button==0:
-                        self.opp_preflop_opportunity = False
                     self.folds += 1
-                    self.folded = True
                     return FoldAction()
             if self.p_win >= self.cutoff and RaiseAction in legal_actions and round_state.button<2:
                 if min_raise == 400:
@@ -287,12 +284,16 @@ class Player(Bot):
         # auction
         elif BidAction in legal_actions:
             max_bid = opp_stack+1 if my_stack > opp_stack else my_stack
-            self.p_win,self.p_win3,self.p_win2 = self.auction_estimate(my_cards, board_cards, 150)
-            if self.p_win < 0.35:
+            self.p_win,self.p_win3,self.p_win2 = self.auction_estimate(my_cards, board_cards, MAX_TRIALS, budget)
+            if self.auction_policy is not None:
+                pot = my_contribution + opp_contribution
+                features = policy_features(self.p_win, self.p_win3, self.p_win2, pot, my_stack)
+                return BidAction(self.auction_policy.bid(features, pot, max_bid))
+            elif self.p_win < 0.35:
                 return BidAction(0)
             elif self.p_win > 0.65:
                 return BidAction(max_bid)
-            elif game_state.round_num <= 0.75*NUM_ROUNDS:
+            elif not self.bid_model.ready():
                 auction_val = int((0.5+self.p_win3-self.p_win2)*max_bid)
                 auction_val = max(auction_val,0)
                 auction_val = min(auction_val,max_bid)
@@ -300,15 +301,15 @@ class Player(Bot):
                 return BidAction(auction_val)
             else:
                 total_raise,opp_raise = self.get_preflop_raises(round_state,active)
-                auction_val = int(self.auction_model(torch.tensor([self.p_win2,self.p_win3,total_raise,opp_raise])).item())
-                # print('auction nn', auction_val)
+                auction_val = int(self.bid_model.predict([self.p_win2,self.p_win3,total_raise,opp_raise]))
+                # print('auction model', auction_val)
                 auction_val = max(auction_val,0)
                 auction_val = min(auction_val,max_bid)
                 return BidAction(auction_val)
 
         # normal round
-        opp = 2 if my_bid > opp_bid else 3
-        p_win,p_lose = self.round_estimate(my_cards,opp,board_cards,150)
+        self.opp_range.update(round_state, active)
+        p_win,p_lose = self.range_estimate(my_cards,board_cards,budget)
         if p_win*opp_contribution - p_lose*(my_contribution+continue_cost) < -1*my_contribution:
             if CheckAction in legal_actions:
                 return CheckAction()
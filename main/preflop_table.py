@@ -0,0 +1,171 @@
+"""
+Precomputed preflop win probabilities for the 169 canonical starting hands.
+
+Preflop equity only depends on the ranks of the two hole cards and whether they
+are suited, so the bot looks it up in a table built offline instead of running
+a Monte Carlo simulation on every decision.
+
+Table layout: the 169 classes live on a 13x13 grid indexed by rank (2=0 .. A=12).
+Pairs sit on the diagonal, suited hands at (high, low) and offsuit hands at
+(low, high).
+
+Asset format (little endian):
+    magic    4s   b'PFEQ'
+    version  H    TABLE_VERSION
+    columns  H    number of opponent variants stored
+    iters    I    monte carlo trials used per entry
+    values   f*   169*columns float32, row major by class index
+
+Column 0 is vs. an opponent holding 2 cards, column 1 is vs. an opponent who won
+the auction and holds 3 cards. Values are strict win probabilities (ties count
+as non-wins), matching Player.preflop_estimate.
+
+Regenerate with: python3 preflop_table.py [--iters N]
+"""
+import os
+import struct
+from array import array
+
+RANKS = '23456789TJQKA'
+SUITS = 'cdhs'
+NUM_CLASSES = 169
+TABLE_MAGIC = b'PFEQ'
+TABLE_VERSION = 1
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.bin')
+HEADER = struct.Struct('<4sHHI')
+
+VS_TWO = 0
+VS_THREE = 1
+
+
+def hand_class(hand):
+    """
+    hand (list): two cards, e.g. ['Ah', 'Kd']
+
+    Returns the canonical class index (0-168) of the starting hand
+    """
+    r1, r2 = RANKS.index(hand[0][0]), RANKS.index(hand[1][0])
+    high, low = max(r1, r2), min(r1, r2)
+    if hand[0][1] == hand[1][1]:
+        return high*13 + low
+    return low*13 + high
+
+
+def class_name(index):
+    """
+    index (int): canonical class index
+
+    Returns the usual shorthand for the class, e.g. 'AKs', 'T9o' or '77'
+    """
+    row, col = divmod(index, 13)
+    if row == col:
+        return RANKS[row]*2
+    if row > col:
+        return RANKS[row] + RANKS[col] + 's'
+    return RANKS[col] + RANKS[row] + 'o'
+
+
+def class_hand(index):
+    """
+    index (int): canonical class index
+
+    Returns a representative pair of cards for the class
+    """
+    row, col = divmod(index, 13)
+    if row > col:
+        return [RANKS[row] + 's', RANKS[col] + 's']
+    return [RANKS[max(row, col)] + 's', RANKS[min(row, col)] + 'h']
+
+
+class PreflopTable():
+    """
+    Read-only view of the preflop equity asset.
+    """
+
+    def __init__(self, values, columns, iters):
+        self.values = values
+        self.columns = columns
+        self.iters = iters
+
+    @classmethod
+    def load(cls, path=TABLE_PATH):
+        """
+        path (str): location of the binary asset
+
+        Returns the loaded PreflopTable, raises ValueError on a malformed or outdated file
+        """
+        with open(path, 'rb') as table_file:
+            data = table_file.read()
+        magic, version, columns, iters = HEADER.unpack_from(data)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            raise ValueError('unsupported preflop table {} v{}'.format(magic, version))
+        values = array('f')
+        values.frombytes(data[HEADER.size:HEADER.size + 4*NUM_CLASSES*columns])
+        if len(values) != NUM_CLASSES*columns:
+            raise ValueError('truncated preflop table')
+        return cls(values, columns, iters)
+
+    def save(self, path=TABLE_PATH):
+        """
+        path (str): where to write the binary asset
+
+        Returns None
+        """
+        with open(path, 'wb') as table_file:
+            table_file.write(HEADER.pack(TABLE_MAGIC, TABLE_VERSION, self.columns, self.iters))
+            table_file.write(self.values.tobytes())
+
+    def lookup(self, hand, opp=2):
+        """
+        hand (list): two cards
+        opp (int): number of cards your opponent will hold (2 or 3)
+
+        Returns probability of winning at showdown
+        """
+        column = VS_TWO if opp == 2 else VS_THREE
+        return self.values[hand_class(hand)*self.columns + column]
+
+
+def simulate(hand, opp, iters):
+    """
+    hand (list): two cards
+    opp (int): number of cards the opponent holds at showdown
+    iters (int): number of monte carlo iterations
+
+    Returns probability of winning against a random opponent hand
+    """
+    import random
+    import eval7
+    my_cards = [eval7.Card(card) for card in hand]
+    deck = [card for card in eval7.Deck().cards if card not in my_cards]
+    wins = 0
+    for i in range(iters):
+        drawn = random.sample(deck, 5+opp)
+        board_cards = drawn[:5]
+        if eval7.evaluate(my_cards+board_cards) > eval7.evaluate(drawn[5:]+board_cards):
+            wins += 1
+    return wins/iters
+
+
+def build(iters):
+    """
+    iters (int): monte carlo iterations per class and column
+
+    Returns a freshly simulated PreflopTable
+    """
+    values = array('f', [0.]*(NUM_CLASSES*2))
+    for index in range(NUM_CLASSES):
+        hand = class_hand(index)
+        values[index*2 + VS_TWO] = simulate(hand, 2, iters)
+        values[index*2 + VS_THREE] = simulate(hand, 3, iters)
+        print(class_name(index), round(values[index*2], 4), round(values[index*2 + 1], 4))
+    return PreflopTable(values, 2, iters)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog='python3 preflop_table.py')
+    parser.add_argument('--iters', type=int, default=40000, help='Monte Carlo trials per entry')
+    parser.add_argument('--out', type=str, default=TABLE_PATH, help='Where to write the table')
+    args = parser.parse_args()
+    build(args.iters).save(args.out)
@@ -0,0 +1,180 @@
+"""
+Opponent profiles kept on disk between matches.
+
+The engine never tells a bot who it is playing, so opponents are recognised by a
+fingerprint of their early behaviour (OpponentStats.fingerprint). Each profile
+is one small uncompressed .npz in PROFILE_DIR holding the fingerprint and the
+total and decayed opponent statistics. Only the MAX_PROFILES most recently
+written are kept.
+
+A match starts from a prior pooled across the stored profiles: their average
+per-round statistics, worth PRIOR_ROUNDS rounds. Once FINGERPRINT_ROUNDS rounds
+have been played the fingerprint picks the closest stored profile, which
+replaces the prior, or a new one starting from scratch, and this match's rounds
+are replayed on top of it. From then on the profile is written back every
+SAVE_EVERY rounds. The stored profiles are read when the store is opened,
+before the game clock runs, so neither the prior nor matching costs file reads.
+
+The POKERBOT_PROFILES environment variable points the store at another
+directory, or turns it off when empty; the offline tools turn it off so their
+matches stay independent of each other.
+"""
+import os
+import uuid
+import numpy as np
+from opponent import OpponentStats, NUM_COUNTERS, ROUNDS, WINDOW
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+PROFILE_VARIABLE = 'POKERBOT_PROFILES'  # environment variable overriding PROFILE_DIR, empty turns the store off
+PROFILE_VERSION = 2
+MAX_PROFILES = 50  # profiles kept, the least recently written are deleted
+FINGERPRINT_ROUNDS = WINDOW  # rounds before the opponent is identified, the window then only holds this match
+MATCH_DISTANCE = 0.15  # largest fingerprint distance still considered the same opponent
+SAVE_EVERY = 100  # rounds between writes of the profile
+PRIOR_ROUNDS = 200  # weight of the pooled prior in rounds, as many as the preflop cutoff waits for without one
+
+
+class ProfileStore():
+    """
+    Directory of opponent profiles, one .npz file each.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, max_profiles=MAX_PROFILES):
+        """
+        directory (str): where profiles live, created on the first save, None keeps no profiles
+        max_profiles (int): most profiles kept on disk
+        """
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.fingerprints = {}  # profile id -> stored fingerprint
+        self.pooled = {'total': [], 'decayed': []}  # per-round statistics of every readable profile
+        for profile_id in self.profile_ids():
+            try:
+                with np.load(self.path(profile_id)) as arrays:
+                    self.fingerprints[profile_id] = arrays['fingerprint']
+                    if int(arrays['version']) != PROFILE_VERSION or arrays['total'].shape != (NUM_COUNTERS,):
+                        continue
+                    for view, rows in self.pooled.items():
+                        if arrays[view][ROUNDS] > 0:
+                            rows.append(arrays[view]/arrays[view][ROUNDS])
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def path(self, profile_id):
+        return os.path.join(self.directory, profile_id + '.npz')
+
+    def profile_ids(self):
+        """
+        Returns the stored profile ids, most recently written first
+        """
+        if self.directory is None:
+            return []
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.npz')]
+        except OSError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [entry.name[:-4] for entry in entries]
+
+    def load(self, profile_id, stats):
+        """
+        profile_id (str): profile to read
+        stats (OpponentStats): updated with the stored statistics
+
+        Returns None, raises OSError if unreadable and ValueError on a malformed or outdated profile
+        """
+        with np.load(self.path(profile_id)) as arrays:
+            if int(arrays['version']) != PROFILE_VERSION or arrays['total'].shape != (NUM_COUNTERS,):
+                raise ValueError('unsupported opponent profile {}'.format(profile_id))
+            stats.load_state(arrays)
+
+    def save(self, profile_id, stats):
+        """
+        profile_id (str): profile to write
+        stats (OpponentStats): statistics to store
+
+        Returns None, the file is replaced atomically so a crash never leaves half a profile
+        """
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fingerprint = stats.fingerprint('total')
+        temporary = self.path(profile_id) + '.tmp'
+        with open(temporary, 'wb') as profile_file:
+            np.savez(profile_file, version=np.array(PROFILE_VERSION), fingerprint=fingerprint, **stats.state())
+        os.replace(temporary, self.path(profile_id))
+        self.fingerprints[profile_id] = fingerprint
+        self.prune()
+
+    def prune(self):
+        """
+        Returns None, deletes the least recently written profiles beyond max_profiles
+        """
+        for profile_id in self.profile_ids()[self.max_profiles:]:
+            self.fingerprints.pop(profile_id, None)
+            try:
+                os.remove(self.path(profile_id))
+            except OSError:
+                pass
+
+    def match(self, fingerprint):
+        """
+        fingerprint (array): OpponentStats.fingerprint of the current opponent
+
+        Returns the id of the closest stored profile within MATCH_DISTANCE, or None
+        """
+        best, best_distance = None, MATCH_DISTANCE
+        for profile_id, stored in self.fingerprints.items():
+            if stored.shape != fingerprint.shape:
+                continue
+            distance = np.linalg.norm(stored - fingerprint)/np.sqrt(len(fingerprint))
+            if distance <= best_distance:
+                best, best_distance = profile_id, distance
+        return best
+
+    def prior(self, prior_rounds=PRIOR_ROUNDS):
+        """
+        prior_rounds (int): weight of the prior in rounds
+
+        Returns OpponentStats holding the average of the stored profiles, empty if there are none
+        """
+        stats = OpponentStats()
+        if self.pooled['total'] and self.pooled['decayed']:
+            # the decayed view never holds more than about 1/(1 - decay) rounds
+            stats.load_state({'total': np.mean(self.pooled['total'], axis=0)*prior_rounds,
+                              'decayed': np.mean(self.pooled['decayed'], axis=0)*min(prior_rounds, 1/(1 - stats.decay))})
+        return stats
+
+    def rebuild(self, profile_id, stats):
+        """
+        profile_id (str): profile to continue from, None starts from scratch
+        stats (OpponentStats): this match's statistics so far, on top of the prior
+
+        Returns OpponentStats starting from the profile with this match's rounds replayed, the prior is dropped
+        """
+        new_stats = OpponentStats()
+        if profile_id is not None:
+            try:
+                self.load(profile_id, new_stats)
+            except (OSError, ValueError):
+                pass
+        for row in stats.rows():
+            new_stats.add(row)
+        return new_stats
+
+
+def configured_directory():
+    """
+    Returns the profile directory set by PROFILE_VARIABLE, PROFILE_DIR if unset and None if empty
+    """
+    directory = os.environ.get(PROFILE_VARIABLE)
+    if directory is None:
+        return PROFILE_DIR
+    return directory or None
+
+
+def new_profile_id():
+    """
+    Returns a fresh profile id
+    """
+    return uuid.uuid4().hex[:12]
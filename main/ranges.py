@@ -0,0 +1,247 @@
+"""
+Range-weighted equity against the opponent's likely holdings.
+
+OpponentRange keeps one weight per possible opponent holding: the 1326 two card
+hands, and the 22100 three card hands once the opponent takes the auction card.
+Each opponent action multiplies the weights by a likelihood that tilts towards
+strong holdings for raises, calls and big bids and towards weak ones for checks,
+where strength is the holding's percentile in the current range. Equity is then
+a weighted sum over every live holding, paired with every board runout when that
+fits in WORK_LIMIT evaluations (exact, covers every river). Otherwise trials draw
+a holding by its weight and a runout for it, under the anytime time budget,
+instead of trials that deal the opponent uniformly random cards.
+"""
+from itertools import combinations
+import numpy as np
+from skeleton.actions import CallAction, CheckAction, RaiseAction
+from skeleton.states import STARTING_STACK
+from skeleton.roundlog import actions_since
+import batch_eval
+import anytime
+
+RAISE_TILT = 2.  # likelihood log-ratio of the strongest vs. weakest holding for a min raise
+RAISE_SIZE_TILT = 2.  # extra log-ratio per pot-sized raise, capped at one pot
+CALL_TILT = 1.  # log-ratio for a call
+CHECK_TILT = -1.  # log-ratio for a check, checks lean weak
+BID_TILT = 3.  # log-ratio for a pot-sized auction bid, capped at one pot
+WORK_LIMIT = 25000  # exact threshold: every (runout, holding) pair is enumerated up to it, e.g. any river; also the trial cap
+
+COMBOS2 = np.array(list(combinations(range(52), 2)), dtype=np.uint8)
+COMBOS3 = np.array(list(combinations(range(52), 3)), dtype=np.uint8)
+BITS2 = batch_eval.CARD_BITS[COMBOS2].sum(axis=1)
+BITS3 = batch_eval.CARD_BITS[COMBOS3].sum(axis=1)
+# PAIR_INDEX[a, b] is the row of {a, b} in COMBOS2
+PAIR_INDEX = np.zeros((52, 52), dtype=np.int32)
+PAIR_INDEX[COMBOS2[:, 0], COMBOS2[:, 1]] = np.arange(len(COMBOS2))
+PAIR_INDEX[COMBOS2[:, 1], COMBOS2[:, 0]] = np.arange(len(COMBOS2))
+# the three pairs inside each three card holding, one of them is the auction card plus two hole cards
+SUBPAIRS = np.stack([PAIR_INDEX[COMBOS3[:, i], COMBOS3[:, j]] for i, j in ((0, 1), (0, 2), (1, 2))], axis=1)
+
+
+def preflop_strength(preflop_table=None):
+    """
+    preflop_table (PreflopTable): equities of the 169 starting hands, None uses a rank heuristic
+
+    Returns (1326,) percentile of every two card holding among all starting hands
+    """
+    ranks, suits = COMBOS2 >> 2, COMBOS2 & 3
+    high, low = ranks.max(axis=1).astype(np.int32), ranks.min(axis=1).astype(np.int32)
+    suited = suits[:, 0] == suits[:, 1]
+    if preflop_table is not None:
+        classes = np.where(suited, high*13 + low, low*13 + high)
+        values = np.array(preflop_table.values, dtype=np.float64)
+        score = values[classes*preflop_table.columns]
+    else:
+        score = high + low/2 + 13*(high == low) + 2*suited - np.minimum(high - low, 5)
+    return percentile(score, np.ones(len(score)))
+
+
+def percentile(score, weights):
+    """
+    score (array): strength of each holding
+    weights (array): weight of each holding
+
+    Returns the weighted fraction of holdings each one beats, ties count half
+    """
+    order = np.argsort(score, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    result = np.empty(len(score))
+    result[order] = (cumulative - weights[order]/2)/max(cumulative[-1], 1e-12)
+    return result
+
+
+def tilt(strength, log_ratio):
+    """
+    strength (array): percentile of each holding
+    log_ratio (float): log of the likelihood ratio between the strongest and weakest holding
+
+    Returns the likelihood of the observed action for each holding
+    """
+    return np.exp(log_ratio*(strength - 0.5))
+
+
+class OpponentRange():
+    """
+    Weights over the opponent's possible holdings for one round.
+    """
+
+    def __init__(self, hand, preflop):
+        """
+        hand (list): your hole cards
+        preflop (array): preflop_strength() of every two card holding
+        """
+        self.preflop = preflop
+        self.holdings = COMBOS2
+        self.bits = BITS2
+        self.weights = np.ones(len(COMBOS2))
+        self.dead = 0
+        self.depth = 0  # actions of the round already applied
+        self.auction_seen = False
+        self.pair_scores = {}  # board size -> hand value of every two card holding on that board
+        self.kill(hand)
+
+    def kill(self, cards):
+        """
+        cards (list): cards the opponent cannot hold
+
+        Returns None
+        """
+        for code in batch_eval.encode(cards):
+            self.dead |= int(batch_eval.CARD_BITS[code])
+        self.weights[(self.bits & self.dead) != 0] = 0.
+
+    def strength(self, board):
+        """
+        board (list): cards on the board
+
+        Returns the percentile of each holding in the current range
+        """
+        if not board:
+            return self.preflop
+        if len(board) not in self.pair_scores:
+            self.pair_scores[len(board)] = batch_eval.evaluate(batch_eval.combine(batch_eval.encode(board), COMBOS2))
+        score = self.pair_scores[len(board)]
+        if self.holdings is COMBOS3:
+            # ranked by the best pair inside the holding, close enough for a likelihood and 15x cheaper
+            score = score[SUBPAIRS].max(axis=1)
+        return percentile(score, self.weights)
+
+    def apply(self, likelihood):
+        """
+        likelihood (array): probability of the observed event given each holding
+
+        Returns None
+        """
+        self.weights *= likelihood
+        total = self.weights.sum()
+        if total > 0:
+            self.weights /= total
+        else:  # the opponent did something the model deems impossible, forget what we knew
+            self.weights = np.where((self.bits & self.dead) != 0, 0., 1.)
+
+    def observe_action(self, state, action):
+        """
+        state (RoundState): the state the opponent acted from
+        action (Action): what they did
+
+        Returns None
+        """
+        if isinstance(action, RaiseAction):
+            opp = state.button % 2
+            pot = max(2*STARTING_STACK - state.stacks[0] - state.stacks[1], 1)
+            size = min((action.amount - state.pips[opp])/pot, 1.)
+            log_ratio = RAISE_TILT + RAISE_SIZE_TILT*size
+        elif isinstance(action, CallAction):
+            log_ratio = CALL_TILT
+        elif isinstance(action, CheckAction):
+            log_ratio = CHECK_TILT
+        else:
+            return
+        self.apply(tilt(self.strength(state.deck[:state.street]), log_ratio))
+
+    def check_auction(self, state, active):
+        """
+        state (RoundState): a state of the round
+        active (int): your player's index
+
+        Returns None, observes the auction the first time a state after it is seen
+        """
+        if not self.auction_seen and state.street == 3 and not state.auction and None not in state.bids:
+            self.observe_auction(state, active)
+
+    def observe_auction(self, state, active):
+        """
+        state (RoundState): the first state after the auction, with both bids
+        active (int): your player's index
+
+        Returns None
+        """
+        self.auction_seen = True
+        before = state.previous_state.stacks  # stacks before the bids were paid
+        pot = max(2*STARTING_STACK - before[0] - before[1], 1)
+        opp_bid = state.bids[1-active]
+        self.apply(tilt(self.strength(state.deck[:3]), BID_TILT*min(opp_bid/pot, 1.)))
+        if opp_bid >= state.bids[active]:  # ties deal the card to both players
+            # P(a, b, c) sums the weight of each pair of them being the hole cards
+            self.holdings = COMBOS3
+            self.bits = BITS3
+            self.weights = self.weights[SUBPAIRS].sum(axis=1)
+        self.kill(state.hands[active])
+
+    def update(self, round_state, active):
+        """
+        round_state (RoundState): the current state
+        active (int): your player's index
+
+        Returns None, applies the opponent's actions and bid since the last update
+        """
+        for state, action in actions_since(round_state, self.depth):
+            self.check_auction(state, active)
+            if state.button % 2 != active:
+                self.observe_action(state, action)
+        self.check_auction(round_state, active)
+        self.depth = round_state.depth
+        self.kill(round_state.deck[:round_state.street])
+
+    def equity(self, hand, board, rng, budget=None):
+        """
+        hand (list): your cards (length 2 or 3)
+        board (list): cards on the board (length 3, 4, or 5)
+        rng (Generator): numpy random generator
+        budget (float): seconds to spend sampling, None samples WORK_LIMIT pairs
+
+        Returns anytime.Estimate of (probability of winning, probability of losing) against the weighted range
+        """
+        unflipped = 5 - len(board)
+        deck = batch_eval.remaining(hand, board)
+        live = np.flatnonzero(self.weights)
+        holdings, weights, bits = self.holdings[live], self.weights[live], self.bits[live]
+        runouts = batch_eval.enumerate_runouts(deck, unflipped)
+        my_vals = batch_eval.evaluate(batch_eval.combine(batch_eval.encode(hand + board), runouts))
+        runout_bits = batch_eval.CARD_BITS[runouts].sum(axis=1)
+        board_cards = batch_eval.encode(board)
+        if len(runouts)*len(holdings) <= WORK_LIMIT:
+            # every runout against every holding, exact
+            index = np.repeat(np.arange(len(runouts)), len(holdings))
+            holdings, weights, bits = np.tile(holdings, (len(runouts), 1)), np.tile(weights, len(runouts)), np.tile(bits, len(runouts))
+            opp_val = batch_eval.evaluate(batch_eval.combine(board_cards, runouts[index], holdings))
+            # a runout that uses one of the holding's cards cannot happen with that holding
+            mass = np.where(runout_bits[index] & bits == 0, weights, 0.)
+            total = mass.sum()
+            if total == 0:  # no live holding left, nothing to go on
+                return anytime.Estimate((0.5, 0.5), len(index), 0.5)
+            return anytime.Estimate((mass[my_vals[index] > opp_val].sum()/total, mass[my_vals[index] < opp_val].sum()/total),
+                                    len(index), 0.)
+        cumulative = np.cumsum(weights)
+
+        def trials(n):
+            # holdings in proportion to their weight, then a runout that does not use their cards
+            picked = np.searchsorted(cumulative, rng.random(n)*cumulative[-1], side='right')
+            index = rng.integers(len(runouts), size=n)
+            clash = (runout_bits[index] & bits[picked]) != 0
+            while clash.any():
+                index[clash] = rng.integers(len(runouts), size=int(clash.sum()))
+                clash[clash] = (runout_bits[index[clash]] & bits[picked[clash]]) != 0
+            opp_val = batch_eval.evaluate(batch_eval.combine(board_cards, runouts[index], holdings[picked]))
+            return my_vals[index] > opp_val, my_vals[index] < opp_val
+        return anytime.estimate(trials, WORK_LIMIT, budget)
@@ -7,6 +7,8 @@ class Bot():
     '''
     The base class for a pokerbot.
     '''
+    # the current round's RoundLog, set and kept up to date by the Runner
+    round_log = None
 
     def handle_new_round(self, game_state, round_state, active):
         '''
@@ -0,0 +1,122 @@
+'''
+Optional timers, counters and profiling for the Runner.
+
+Nothing here runs unless the Runner is given an Instruments object, e.g. with
+python3 player.py --instrument [--profile FILE] PORT.
+'''
+from collections import defaultdict
+import cProfile
+import time
+
+BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]  # upper edges in milliseconds
+STREETS = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+
+
+def street_name(round_state):
+    '''
+    Names the street a decision is made on, the auction counts as its own street.
+    '''
+    return 'auction' if round_state.auction else STREETS.get(round_state.street, str(round_state.street))
+
+
+class Instruments():
+    '''
+    Collects where the bot's time goes over one game.
+
+    Phases:
+    wait: blocked reading the next packet, i.e. engine and opponent time.
+    parse: decoding clauses and rebuilding RoundState, excluding bot callbacks.
+    handle_new_round, handle_round_over, get_action: time inside the bot.
+    send: encoding and writing the response.
+    '''
+
+    def __init__(self, profile_path=None, profile_every=1):
+        '''
+        profile_path: if given, get_action runs under cProfile and the stats are written there at game end.
+        profile_every: only profile every n-th decision, to keep the overhead down.
+        '''
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.clauses = defaultdict(int)
+        self.histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self.worst = defaultdict(float)
+        self.callback_seconds = 0.
+        self.first_clock = None
+        self.min_clock = None
+        self.decisions = 0
+        self.profile_path = profile_path
+        self.profile_every = profile_every
+        self.profiler = cProfile.Profile() if profile_path else None
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def call(self, phase, method, *args):
+        '''
+        Times one bot callback and returns its result.
+        '''
+        start_time = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - start_time
+        self.add(phase, elapsed)
+        self.callback_seconds += elapsed
+        return result
+
+    def decide(self, get_action, game_state, round_state, active):
+        '''
+        Times get_action, filing it under its street and profiling it when due.
+        '''
+        if self.first_clock is None:
+            self.first_clock = game_state.game_clock
+        if self.min_clock is None or game_state.game_clock < self.min_clock:
+            self.min_clock = game_state.game_clock
+        profiling = self.profiler is not None and self.decisions % self.profile_every == 0
+        self.decisions += 1
+        if profiling:
+            self.profiler.enable()
+        start_time = time.perf_counter()
+        action = get_action(game_state, round_state, active)
+        elapsed = time.perf_counter() - start_time
+        if profiling:
+            self.profiler.disable()
+        self.add('get_action', elapsed)
+        street = street_name(round_state)
+        ms = elapsed * 1000.
+        bucket = 0
+        while bucket < len(BUCKETS) and ms > BUCKETS[bucket]:
+            bucket += 1
+        self.histograms[street][bucket] += 1
+        self.worst[street] = max(self.worst[street], ms)
+        return action
+
+    def summary(self, game_state):
+        '''
+        Returns the collected numbers as printable text.
+        '''
+        lines = ['Runner instrumentation over {} decisions'.format(self.decisions)]
+        lines.append('{:<18} {:>8} {:>11} {:>9}'.format('phase', 'calls', 'total ms', 'mean ms'))
+        for phase in ['wait', 'parse', 'handle_new_round', 'get_action', 'handle_round_over', 'send']:
+            if self.calls[phase]:
+                lines.append('{:<18} {:>8} {:>11.1f} {:>9.3f}'.format(
+                    phase, self.calls[phase], self.seconds[phase] * 1000., self.seconds[phase] * 1000. / self.calls[phase]))
+        lines.append('clauses: ' + ' '.join('{}={}'.format(kind, count) for kind, count in sorted(self.clauses.items())))
+        if self.first_clock is not None:
+            lines.append('game clock: {:.3f}s at first decision, {:.3f}s lowest, {:.3f}s at end'.format(
+                self.first_clock, self.min_clock, game_state.game_clock))
+        edges = ['<={}'.format(edge) for edge in BUCKETS] + ['>{}'.format(BUCKETS[-1])]
+        lines.append('get_action ms      ' + ' '.join('{:>6}'.format(edge) for edge in edges) + '    worst')
+        for street in ['preflop', 'auction', 'flop', 'turn', 'river']:
+            if street in self.histograms:
+                lines.append('{:<18} '.format(street) + ' '.join('{:>6}'.format(count) for count in self.histograms[street])
+                             + ' {:>8.1f}'.format(self.worst[street]))
+        return '\n'.join(lines)
+
+    def report(self, game_state):
+        '''
+        Prints the summary and writes the profile, called when the game ends.
+        '''
+        print(self.summary(game_state))
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile_path)
+            print('get_action profile written to', self.profile_path)
@@ -0,0 +1,78 @@
+'''
+Running per-round action summary maintained by the Runner.
+'''
+from .actions import RaiseAction
+from .states import TerminalState, STARTING_STACK
+
+STREETS = [0, 3, 4, 5]
+
+
+def actions_since(round_state, depth=0):
+    '''
+    Returns (state, action) for every action taken from round_state's depth-th action on,
+    oldest first, where state is the RoundState the action was taken from. Folds end the
+    round without entering the history, so they are not included.
+    '''
+    states = []
+    state = round_state
+    while state is not None and state.depth >= depth:
+        states.append(state)
+        state = state.previous_state
+    history = round_state.history()
+    return [(previous, history[previous.depth]) for previous, state in zip(states[:0:-1], states[-2::-1])
+            if state.depth > previous.depth]
+
+
+class RoundLog():
+    '''
+    Summarizes one round's actions as they happen, so features like preflop raise
+    totals are O(1) lookups instead of walks along previous_state.
+    '''
+
+    def __init__(self, round_state):
+        '''
+        round_state: the RoundState the round starts from.
+        '''
+        self.state = round_state
+        self.actions = {street: [] for street in STREETS}  # (player, action) in order
+        self.raises = {street: [0, 0] for street in STREETS}  # number of raises per player
+        self.raise_sizes = {street: [] for street in STREETS}  # (player, raise to amount) in order
+        self.aggressor = {street: None for street in STREETS}  # last player to raise
+        self.preflop_pips = list(round_state.pips)  # pips in the last preflop state
+        self.preflop_excess = [0, 0]  # each player's pip lead summed over the preflop states after the blinds
+
+    def record(self, round_state, action, new_state):
+        '''
+        Adds the action taken from round_state, which led to new_state.
+        '''
+        player = round_state.button % 2
+        street = round_state.street
+        self.actions[street].append((player, action))
+        if isinstance(action, RaiseAction):
+            self.raises[street][player] += 1
+            self.raise_sizes[street].append((player, action.amount))
+            self.aggressor[street] = player
+        # an action creates at most two states, e.g. a call and then the next street
+        latest = True
+        state = new_state
+        while state is not round_state:
+            if not isinstance(state, TerminalState) and state.street == 0:
+                if latest:
+                    self.preflop_pips = state.pips
+                    latest = False
+                for i in range(2):
+                    self.preflop_excess[i] += max(0, state.pips[i] - state.pips[1-i])
+            state = state.previous_state
+        self.state = new_state.previous_state if isinstance(new_state, TerminalState) else new_state
+
+    def pot(self):
+        '''
+        Returns the chips both players have put in so far.
+        '''
+        return 2 * STARTING_STACK - self.state.stacks[0] - self.state.stacks[1]
+
+    def preflop_raises(self, active):
+        '''
+        Returns (the opponent's pip at the end of preflop, the opponent's pip lead summed over preflop states).
+        '''
+        return self.preflop_pips[1-active], self.preflop_excess[1-active]
@@ -3,10 +3,17 @@ The infrastructure for interacting with the engine.
 '''
 import argparse
 import socket
+import time
 from .actions import FoldAction, CallAction, CheckAction, RaiseAction, BidAction
 from .states import GameState, TerminalState, RoundState
 from .states import STARTING_STACK, BIG_BLIND, SMALL_BLIND
 from .bot import Bot
+from .instruments import Instruments
+from .transport import FramedChannel
+from .roundlog import RoundLog
+
+
+START_TIME = time.perf_counter()  # when the bot started importing, for the startup time
 
 
 class Runner():
@@ -14,111 +21,202 @@ class Runner():
     Interacts with the engine.
     '''
 
-    def __init__(self, pokerbot, socketfile):
+    def __init__(self, pokerbot, socketfile, instruments=None):
         self.pokerbot = pokerbot
         self.socketfile = socketfile
+        self.instruments = instruments
+        self.game_state = GameState(0, 0., 1)
+        self.round_state = None
+        self.round_log = None
+        self.active = 0
+        self.round_flag = True
+        self.report_think_time = False
+        self.unix_path = None
 
     def receive(self):
         '''
         Generator for incoming messages from the engine.
         '''
         while True:
-            packet = self.socketfile.readline().strip().split(' ')
+            if self.instruments is not None:
+                start_time = time.perf_counter()
+                packet = self.socketfile.readline().strip().split(' ')
+                self.instruments.add('wait', time.perf_counter() - start_time)
+            else:
+                packet = self.socketfile.readline().strip().split(' ')
             if not packet:
                 break
             yield packet
 
-    def send(self, action):
+    def encode(self, action):
         '''
-        Encodes an action and sends it to the engine.
+        Encodes an action as a response clause.
         '''
         if isinstance(action, FoldAction):
-            code = 'F'
+            return 'F'
         elif isinstance(action, CallAction):
-            code = 'C'
+            return 'C'
         elif isinstance(action, CheckAction):
-            code = 'K'
+            return 'K'
         elif isinstance(action, BidAction): 
-            code = 'A' + str(action.amount)
+            return 'A' + str(action.amount)
         else:  # isinstance(action, RaiseAction)
-            code = 'R' + str(action.amount)
-        self.socketfile.write(code + '\n')
+            return 'R' + str(action.amount)
+
+    def send(self, action, think_time=None):
+        '''
+        Encodes an action and sends it to the engine, with the think time if the engine asked for it.
+        '''
+        if self.instruments is not None:
+            start_time = time.perf_counter()
+        message = self.encode(action)
+        if self.report_think_time and think_time is not None:
+            message += ' t{:.6f}'.format(think_time)
+        if self.unix_path is not None:
+            message += ' u'  # accept the engine's offer of a Unix domain socket
+        self.socketfile.write(message + '\n')
         self.socketfile.flush()
+        if self.instruments is not None:
+            self.instruments.add('send', time.perf_counter() - start_time)
+
+    def process(self, packet):
+        '''
+        Reconstructs the game tree from one packet of clauses received from the engine.
+        Returns the action to respond with, or None once the engine ends the game.
+        '''
+        game_state = self.game_state
+        round_state = self.round_state
+        active = self.active
+        instruments = self.instruments
+        if instruments is not None:
+            start_time = time.perf_counter()
+            callback_seconds = instruments.callback_seconds
+        for clause in packet:
+            if instruments is not None:
+                instruments.clauses[clause[0]] += 1
+            if clause[0] == 'T':
+                game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
+            elif clause[0] == 'P':
+                active = int(clause[1:])
+            elif clause[0] == 'H':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                pips = [SMALL_BLIND, BIG_BLIND]
+                stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
+                round_state = RoundState(0, 0, False, [None, None], pips, stacks, hands, [], None)
+                self.round_log = RoundLog(round_state)
+                self.pokerbot.round_log = self.round_log
+                if self.round_flag:
+                    self.callback('handle_new_round', game_state, round_state, active)
+                    self.round_flag = False
+            elif clause[0] == 'F':
+                round_state = self.proceed(round_state, FoldAction())
+            elif clause[0] == 'C':
+                round_state = self.proceed(round_state, CallAction())
+            elif clause[0] == 'K':
+                round_state = self.proceed(round_state, CheckAction())
+            elif clause[0] == 'R':
+                round_state = self.proceed(round_state, RaiseAction(int(clause[1:])))
+            elif clause[0] == 'A': 
+                round_state = self.proceed(round_state, BidAction(int(clause[1:])))
+            elif clause[0] == 'N':
+                hands = [[], []]
+                stacks, bids, active_hands = clause[1:].split('_')
+                bids = bids.split(',')
+                bids = [int(x) for x in bids]
+                stacks = stacks.split(',')
+                stacks = [int(x) for x in stacks]
+                hands[active] = active_hands.split(',')
+                # the state was just created by the bids in this packet, so it can be updated in place
+                round_state.bids = bids
+                round_state.stacks = stacks
+                round_state.hands = hands
+            elif clause[0] == 'B':
+                # likewise the state was just created by the action that ended the street
+                round_state.deck = clause[1:].split(',')
+            elif clause[0] == 'O':
+                # backtrack
+                round_state = round_state.previous_state
+                revised_hands = list(round_state.hands)
+                revised_hands[1-active] = clause[1:].split(',')
+                # rebuild history
+                round_state = RoundState(round_state.button, round_state.street, round_state.auction, round_state.bids,
+                                        round_state.pips, round_state.stacks, revised_hands, round_state.deck,
+                                        round_state.previous_state, round_state.actions, round_state.depth)
+                round_state = TerminalState([0, 0], round_state.bids, round_state)
+            elif clause[0] == 'D':
+                assert isinstance(round_state, TerminalState)
+                delta = int(clause[1:])
+                deltas = [-delta, -delta]
+                deltas[active] = delta
+                round_state = TerminalState(deltas, round_state.bids, round_state.previous_state)
+                game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
+                self.callback('handle_round_over', game_state, round_state, active)
+                game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                self.round_flag = True
+            elif clause[0] == 'X':
+                # the engine wants our think time with every response
+                self.report_think_time = True
+            elif clause[0] == 'U':
+                if hasattr(socket, 'AF_UNIX'):
+                    self.unix_path = clause[1:]
+            elif clause[0] == 'Q':
+                if instruments is not None:
+                    instruments.report(game_state)
+                return None
+        self.game_state = game_state
+        self.round_state = round_state
+        self.active = active
+        if instruments is not None:
+            instruments.add('parse', time.perf_counter() - start_time - (instruments.callback_seconds - callback_seconds))
+        if self.round_flag:  # ack the engine
+            return CheckAction()
+        assert active == round_state.button % 2
+        if instruments is not None:
+            return instruments.decide(self.pokerbot.get_action, game_state, round_state, active)
+        return self.pokerbot.get_action(game_state, round_state, active)
+
+    def proceed(self, round_state, action):
+        '''
+        Advances round_state by an action and records it in the round log.
+        '''
+        new_state = round_state.proceed(action)
+        self.round_log.record(round_state, action, new_state)
+        return new_state
+
+    def callback(self, name, game_state, round_state, active):
+        '''
+        Calls handle_new_round or handle_round_over on the pokerbot, timed if instrumented.
+        '''
+        if self.instruments is not None:
+            self.instruments.call(name, getattr(self.pokerbot, name), game_state, round_state, active)
+        else:
+            getattr(self.pokerbot, name)(game_state, round_state, active)
 
     def run(self):
         '''
         Reconstructs the game tree based on the action history received from the engine.
         '''
-        game_state = GameState(0, 0., 1)
-        round_state = None
-        active = 0
-        round_flag = True
         for packet in self.receive():
-            for clause in packet:
-                if clause[0] == 'T':
-                    game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
-                elif clause[0] == 'P':
-                    active = int(clause[1:])
-                elif clause[0] == 'H':
-                    hands = [[], []]
-                    hands[active] = clause[1:].split(',')
-                    pips = [SMALL_BLIND, BIG_BLIND]
-                    stacks = [STARTING_STACK - SMALL_BLIND, STARTING_STACK - BIG_BLIND]
-                    round_state = RoundState(0, 0, False, [None, None], pips, stacks, hands, [], None)
-                    if round_flag:
-                        self.pokerbot.handle_new_round(game_state, round_state, active)
-                        round_flag = False
-                elif clause[0] == 'F':
-                    round_state = round_state.proceed(FoldAction())
-                elif clause[0] == 'C':
-                    round_state = round_state.proceed(CallAction())
-                elif clause[0] == 'K':
-                    round_state = round_state.proceed(CheckAction())
-                elif clause[0] == 'R':
-                    round_state = round_state.proceed(RaiseAction(int(clause[1:])))
-                elif clause[0] == 'A': 
-                    round_state = round_state.proceed(BidAction(int(clause[1:])))
-                elif clause[0] == 'N':
-                    hands = [[], []]
-                    stacks, bids, active_hands = clause[1:].split('_')
-                    bids = bids.split(',')
-                    bids = [int(x) for x in bids]
-                    stacks = stacks.split(',')
-                    stacks = [int(x) for x in stacks]
-                    hands[active] = active_hands.split(',')
-                    round_state = RoundState(round_state.button, round_state.street, round_state.auction, bids, round_state.pips, stacks, hands, round_state.deck, round_state)
-                elif clause[0] == 'B':
-                    round_state = RoundState(round_state.button, round_state.street, round_state.auction, round_state.bids, 
-                                            round_state.pips, round_state.stacks, round_state.hands, clause[1:].split(','), 
-                                            round_state.previous_state)
-                elif clause[0] == 'O':
-                    # backtrack
-                    round_state = round_state.previous_state
-                    revised_hands = list(round_state.hands)
-                    revised_hands[1-active] = clause[1:].split(',')
-                    # rebuild history
-                    round_state = RoundState(round_state.button, round_state.street, round_state.auction, round_state.bids, 
-                                            round_state.pips, round_state.stacks, revised_hands, round_state.deck, 
-                                            round_state.previous_state)
-                    round_state = TerminalState([0, 0], round_state.bids, round_state)
-                elif clause[0] == 'D':
-                    assert isinstance(round_state, TerminalState)
-                    delta = int(clause[1:])
-                    deltas = [-delta, -delta]
-                    deltas[active] = delta
-                    round_state = TerminalState(deltas, round_state.bids, round_state.previous_state)
-                    game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
-                    self.pokerbot.handle_round_over(game_state, round_state, active)
-                    game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
-                    round_flag = True
-                elif clause[0] == 'Q':
-                    return
-            if round_flag:  # ack the engine
-                self.send(CheckAction())
-            else:
-                assert active == round_state.button % 2
-                action = self.pokerbot.get_action(game_state, round_state, active)
-                self.send(action)
+            start_time = time.perf_counter()
+            action = self.process(packet)
+            if action is None:
+                return
+            self.send(action, time.perf_counter() - start_time)
+            if self.unix_path is not None:
+                self.switch_transport()
+
+    def switch_transport(self):
+        '''
+        Moves to the Unix domain socket the engine offered, staying on TCP if that fails.
+        '''
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.unix_path)
+            self.socketfile = FramedChannel(sock)
+        except OSError:
+            print('Could not connect to', self.unix_path)
+        self.unix_path = None
 
 
 def parse_args():
@@ -127,6 +225,9 @@ def parse_args():
     '''
     parser = argparse.ArgumentParser(prog='python3 player.py')
     parser.add_argument('--host', type=str, default='localhost', help='Host to connect to, defaults to localhost')
+    parser.add_argument('--instrument', action='store_true', help='Time every phase and print a summary at game end')
+    parser.add_argument('--profile', type=str, default=None, help='Run get_action under cProfile and write the stats to this file')
+    parser.add_argument('--profile-every', type=int, default=1, help='Only profile every n-th decision')
     parser.add_argument('port', type=int, help='Port on host to connect to')
     return parser.parse_args()
 
@@ -140,8 +241,14 @@ def run_bot(pokerbot, args):
     except OSError:
         print('Could not connect to {}:{}'.format(args.host, args.port))
         return
+    print('Connected {:.3f}s after startup'.format(time.perf_counter() - START_TIME))
     socketfile = sock.makefile('rw')
-    runner = Runner(pokerbot, socketfile)
+    instruments = None
+    if args.instrument or args.profile:
+        instruments = Instruments(args.profile, args.profile_every)
+    runner = Runner(pokerbot, socketfile, instruments)
     runner.run()
+    if runner.socketfile is not socketfile:
+        runner.socketfile.close()
     socketfile.close()
     sock.close()
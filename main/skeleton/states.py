@@ -13,10 +13,58 @@ BIG_BLIND = 2
 SMALL_BLIND = 1
 
 
-class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids', 'pips', 'stacks', 'hands', 'deck', 'previous_state'])):
+class RoundState():
     '''
     Encodes the game tree for one round of poker.
+
+    States are small __slots__ objects, and lists a step leaves unchanged are shared
+    with the next state instead of copied. All states of a round share one action
+    buffer, so history() and undo() are cheap; a state proceeds from the middle of
+    the buffer (e.g. in a tree search) by copying the part it needs first.
     '''
+    __slots__ = ['button', 'street', 'auction', 'bids', 'pips', 'stacks', 'hands', 'deck', 'previous_state', 'actions', 'depth']
+
+    def __init__(self, button, street, auction, bids, pips, stacks, hands, deck, previous_state, actions=None, depth=0):
+        self.button = button
+        self.street = street
+        self.auction = auction
+        self.bids = bids
+        self.pips = pips
+        self.stacks = stacks
+        self.hands = hands
+        self.deck = deck
+        self.previous_state = previous_state
+        self.actions = [] if actions is None else actions
+        self.depth = depth
+
+    def __repr__(self):
+        return 'RoundState(button={}, street={}, auction={}, bids={}, pips={}, stacks={}, hands={}, deck={})'.format(
+            self.button, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck)
+
+    def history(self):
+        '''
+        Returns the list of actions taken this round up to this state.
+        '''
+        return self.actions[:self.depth]
+
+    def undo(self):
+        '''
+        Returns the state before the last action, or None at the start of the round.
+        '''
+        state = self.previous_state
+        while state is not None and state.depth == self.depth:
+            state = state.previous_state
+        return state
+
+    def record(self, action):
+        '''
+        Appends an action to the round's buffer and returns (buffer, depth) for the next state.
+        '''
+        actions = self.actions
+        if len(actions) != self.depth:  # another line was played from here, keep it intact
+            actions = actions[:self.depth]
+        actions.append(action)
+        return actions, self.depth + 1
 
     def showdown(self):
         '''
@@ -55,12 +103,12 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids
         '''
         Resets the players' pips and advances the game tree to the next round of betting.
         '''
+        actions, depth = self.actions, self.depth
         if self.street == 5:
             return self.showdown()
         if self.street == 0:
-            return RoundState(1, 3, True, self.bids, [0, 0], self.stacks, self.hands, self.deck, self)
-        return RoundState(1, self.street + 1, False, self.bids, [0, 0], self.stacks, self.hands, self.deck, self)
-
+            return RoundState(1, 3, True, self.bids, [0, 0], self.stacks, self.hands, self.deck, self, actions, depth)
+        return RoundState(1, self.street + 1, False, self.bids, [0, 0], self.stacks, self.hands, self.deck, self, actions, depth)
 
     def proceed(self, action):
         '''
@@ -70,44 +118,39 @@ class RoundState(namedtuple('_RoundState', ['button', 'street', 'auction', 'bids
         if isinstance(action, FoldAction):
             delta = self.stacks[0] - STARTING_STACK if active == 0 else STARTING_STACK - self.stacks[1]
             return TerminalState([delta, -delta], self.bids, self)
+        actions, depth = self.record(action)
         if isinstance(action, CallAction):
             if self.button == 0:  # sb calls bb
-                return RoundState(1, 0, self.auction, self.bids, [BIG_BLIND] * 2, [STARTING_STACK - BIG_BLIND] * 2, self.hands, self.deck, self)
+                return RoundState(1, 0, self.auction, self.bids, [BIG_BLIND] * 2, [STARTING_STACK - BIG_BLIND] * 2, self.hands, self.deck, self,
+                                  actions, depth)
             # both players acted
-            new_pips = list(self.pips)
+            contribution = self.pips[1-active] - self.pips[active]
+            new_pips = [self.pips[1-active]] * 2
             new_stacks = list(self.stacks)
-            contribution = new_pips[1-active] - new_pips[active]
             new_stacks[active] -= contribution
-            new_pips[active] += contribution
-            state = RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self)
+            state = RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self,
+                               actions, depth)
             return state.proceed_street()
         if isinstance(action, CheckAction):
             if (self.street == 0 and self.button > 0) or self.button > 1:  # both players acted
-                return self.proceed_street()
+                # step to a state holding the check first, so a showdown's history ends with it
+                state = RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self,
+                                   actions, depth)
+                return state.proceed_street()
             # let opponent act
-            return RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
+            return RoundState(self.button + 1, self.street, self.auction, self.bids, self.pips, self.stacks, self.hands, self.deck, self,
+                              actions, depth)
         if isinstance(action, BidAction):
-            self.bids[active] = -1 
-            if None not in self.bids:       # both players have submitted bids and we deal the extra card
-                # case in which bids are equal, both players receive card
-                if self.bids[0] == self.bids[1]:
-                    # new_stacks = list(self.stacks)
-                    # new_stacks[0] -= self.bids[0]
-                    # new_stacks[1] -= self.bids[1]
-                    state = RoundState(1, self.street, False, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
-                else:
-                # case in which bids are not equal
-                    # winner = self.bids.index(max(self.bids))
-                    # new_stacks = list(self.stacks)
-                    # new_stacks[winner] -= self.bids[1 - winner]
-                    state = RoundState(1, self.street, False, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
-                return state
-            else:
-                return RoundState(self.button + 1, self.street, True, self.bids, self.pips, self.stacks, self.hands, self.deck, self)
+            new_bids = list(self.bids)
+            new_bids[active] = -1  # the engine sends the real bids with the N clause
+            if None not in new_bids:  # both players have submitted bids and we deal the extra card
+                return RoundState(1, self.street, False, new_bids, self.pips, self.stacks, self.hands, self.deck, self, actions, depth)
+            return RoundState(self.button + 1, self.street, True, new_bids, self.pips, self.stacks, self.hands, self.deck, self, actions, depth)
         # isinstance(action, RaiseAction)
+        contribution = action.amount - self.pips[active]
         new_pips = list(self.pips)
         new_stacks = list(self.stacks)
-        contribution = action.amount - new_pips[active]
         new_stacks[active] -= contribution
-        new_pips[active] += contribution
-        return RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self)
\ No newline at end of file
+        new_pips[active] = action.amount
+        return RoundState(self.button + 1, self.street, self.auction, self.bids, new_pips, new_stacks, self.hands, self.deck, self,
+                          actions, depth)
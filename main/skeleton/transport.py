@@ -0,0 +1,55 @@
+'''
+Framed transport the engine may offer at connect time instead of the TCP text stream.
+engine.py keeps a copy of FramedChannel; python3 checks.py transport checks they agree.
+'''
+import struct
+
+FRAME_HEADER = struct.Struct('<I')
+
+
+class FramedChannel():
+    '''
+    File-like wrapper over a stream socket that sends each flushed message as one
+    length-prefixed frame, so reading a packet never scans for a newline.
+    '''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = []
+
+    def write(self, message):
+        self.buffer.append(message)
+
+    def flush(self):
+        data = ''.join(self.buffer).rstrip('\n').encode()
+        self.buffer = []
+        self.sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+    def recv_exactly(self, size):
+        '''
+        Reads size bytes, or fewer if the other side closed the connection.
+        '''
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def readline(self):
+        '''
+        Returns the next frame as a line of text, or '' once the connection is closed.
+        '''
+        header = self.recv_exactly(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return ''
+        return self.recv_exactly(FRAME_HEADER.unpack(header)[0]).decode() + '\n'
+
+    def close(self):
+        if self.buffer:
+            try:
+                self.flush()
+            except OSError:
+                pass
+        self.sock.close()
@@ -0,0 +1,299 @@
+'''
+Headless in-process match simulator.
+
+Runs the regular engine Game, but loads each pokerbot's player.py into this
+process and hands every engine message straight to the bot's Runner instead of
+going through a subprocess and a TCP socket. Bots on a skeleton whose Runner can
+only read a socket are driven by a SkeletonDriver instead. Deltas, game clock accounting and
+the game log are the same as engine.py produces.
+'''
+from contextlib import redirect_stdout
+import importlib
+import os
+import time
+import sys
+import traceback
+
+import engine
+from engine import Game
+from config import *
+
+PROFILE_VARIABLE = 'POKERBOT_PROFILES'  # where bots like main/ keep opponent profiles, empty turns them off
+
+
+def load_bot(path):
+    '''
+    Imports player.py from a bot directory and returns (pokerbot, the bot's skeleton.runner module).
+
+    Modules imported from the bot directory are removed from sys.modules again,
+    so two bots with their own player.py and skeleton can live side by side.
+    '''
+    path = os.path.abspath(path)
+    cwd = os.getcwd()
+    saved_path = list(sys.path)
+    saved_modules = dict(sys.modules)
+    for name in list(sys.modules):
+        if name == 'player' or name == 'skeleton' or name.startswith('skeleton.'):
+            del sys.modules[name]
+    sys.path.insert(0, path)
+    os.chdir(path)
+    try:
+        player_module = importlib.import_module('player')
+        runner_module = importlib.import_module('skeleton.runner')
+        pokerbot = player_module.Player()
+    finally:
+        os.chdir(cwd)
+        sys.path[:] = saved_path
+        for name in list(sys.modules):
+            module_file = getattr(sys.modules[name], '__file__', None)
+            if name not in saved_modules and module_file and os.path.abspath(module_file).startswith(path + os.sep):
+                del sys.modules[name]
+        sys.modules.update(saved_modules)
+    return pokerbot, runner_module
+
+
+class CappedOutput():
+    '''
+    Text sink for a bot's prints which keeps at most PLAYER_LOG_SIZE_LIMIT bytes.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        if self.size < PLAYER_LOG_SIZE_LIMIT:
+            self.chunks.append(text)
+            self.size += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+class SkeletonDriver():
+    '''
+    Rebuilds the game tree from engine packets for a bot whose Runner only knows how to
+    read a socket, like the stock skeleton's. It follows that Runner's clause handling
+    on the bot's own skeleton states and actions, one packet at a time.
+    '''
+
+    def __init__(self, pokerbot, skeleton):
+        '''
+        skeleton: the bot's skeleton.runner module, which imports the states and actions it uses.
+        '''
+        self.pokerbot = pokerbot
+        self.skeleton = skeleton
+        self.game_state = skeleton.GameState(0, 0., 1)
+        self.round_state = None
+        self.active = 0
+        self.round_flag = True
+
+    def encode(self, action):
+        '''
+        Encodes an action as a response clause.
+        '''
+        if isinstance(action, self.skeleton.FoldAction):
+            return 'F'
+        elif isinstance(action, self.skeleton.CallAction):
+            return 'C'
+        elif isinstance(action, self.skeleton.CheckAction):
+            return 'K'
+        elif isinstance(action, self.skeleton.BidAction):
+            return 'A' + str(action.amount)
+        else:  # isinstance(action, RaiseAction)
+            return 'R' + str(action.amount)
+
+    def process(self, packet):
+        '''
+        Applies one packet of clauses. Returns the action to respond with, or None once the engine ends the game.
+        '''
+        skeleton = self.skeleton
+        GameState, RoundState, TerminalState = skeleton.GameState, skeleton.RoundState, skeleton.TerminalState
+        game_state, round_state, active = self.game_state, self.round_state, self.active
+        for clause in packet:
+            if clause[0] == 'T':
+                game_state = GameState(game_state.bankroll, float(clause[1:]), game_state.round_num)
+            elif clause[0] == 'P':
+                active = int(clause[1:])
+            elif clause[0] == 'H':
+                hands = [[], []]
+                hands[active] = clause[1:].split(',')
+                pips = [skeleton.SMALL_BLIND, skeleton.BIG_BLIND]
+                stacks = [skeleton.STARTING_STACK - skeleton.SMALL_BLIND, skeleton.STARTING_STACK - skeleton.BIG_BLIND]
+                round_state = RoundState(0, 0, False, [None, None], pips, stacks, hands, [], None)
+                if self.round_flag:
+                    self.pokerbot.handle_new_round(game_state, round_state, active)
+                    self.round_flag = False
+            elif clause[0] == 'F':
+                round_state = round_state.proceed(skeleton.FoldAction())
+            elif clause[0] == 'C':
+                round_state = round_state.proceed(skeleton.CallAction())
+            elif clause[0] == 'K':
+                round_state = round_state.proceed(skeleton.CheckAction())
+            elif clause[0] == 'R':
+                round_state = round_state.proceed(skeleton.RaiseAction(int(clause[1:])))
+            elif clause[0] == 'A':
+                round_state = round_state.proceed(skeleton.BidAction(int(clause[1:])))
+            elif clause[0] == 'N':
+                hands = [[], []]
+                stacks, bids, active_hands = clause[1:].split('_')
+                hands[active] = active_hands.split(',')
+                round_state = RoundState(round_state.button, round_state.street, round_state.auction,
+                                         [int(x) for x in bids.split(',')], round_state.pips,
+                                         [int(x) for x in stacks.split(',')], hands, round_state.deck, round_state)
+            elif clause[0] == 'B':
+                round_state = RoundState(round_state.button, round_state.street, round_state.auction, round_state.bids,
+                                         round_state.pips, round_state.stacks, round_state.hands, clause[1:].split(','),
+                                         round_state.previous_state)
+            elif clause[0] == 'O':
+                # backtrack and rebuild the last state with the opponent's cards
+                round_state = round_state.previous_state
+                revised_hands = list(round_state.hands)
+                revised_hands[1-active] = clause[1:].split(',')
+                round_state = RoundState(round_state.button, round_state.street, round_state.auction, round_state.bids,
+                                         round_state.pips, round_state.stacks, revised_hands, round_state.deck,
+                                         round_state.previous_state)
+                round_state = TerminalState([0, 0], round_state.bids, round_state)
+            elif clause[0] == 'D':
+                delta = int(clause[1:])
+                deltas = [-delta, -delta]
+                deltas[active] = delta
+                round_state = TerminalState(deltas, round_state.bids, round_state.previous_state)
+                game_state = GameState(game_state.bankroll + delta, game_state.game_clock, game_state.round_num)
+                self.pokerbot.handle_round_over(game_state, round_state, active)
+                game_state = GameState(game_state.bankroll, game_state.game_clock, game_state.round_num + 1)
+                self.round_flag = True
+            elif clause[0] == 'Q':
+                return None
+        self.game_state, self.round_state, self.active = game_state, round_state, active
+        if self.round_flag:  # ack the engine
+            return skeleton.CheckAction()
+        return self.pokerbot.get_action(game_state, round_state, active)
+
+
+class DirectChannel():
+    '''
+    File-like stand-in for the engine's socket file which calls the bot's Runner, or a
+    SkeletonDriver, directly.
+    '''
+
+    def __init__(self, runner, output):
+        self.runner = runner
+        self.output = output
+        self.message = ''
+        self.response = ''
+        self.closed = False
+
+    def write(self, message):
+        if self.closed:
+            raise OSError('bot stopped')
+        self.message += message
+
+    def flush(self):
+        packet = self.message.strip().split(' ')
+        self.message = ''
+        if self.closed:
+            raise OSError('bot stopped')
+        try:
+            start_time = time.perf_counter()
+            with redirect_stdout(self.output):
+                action = self.runner.process(packet)
+            think_time = time.perf_counter() - start_time
+        except Exception:
+            # a crashing bot looks like a disconnected subprocess to the engine
+            self.output.write(traceback.format_exc())
+            self.closed = True
+            raise OSError('bot crashed')
+        self.response = '' if action is None else '{} t{:.6f}'.format(self.runner.encode(action), think_time)
+
+    def readline(self):
+        return self.response + '\n'
+
+    def close(self):
+        self.closed = True
+
+
+class InProcessPlayer(engine.Player):
+    '''
+    Runs one player's pokerbot inside the engine process.
+    '''
+
+    def __init__(self, name, path):
+        super().__init__(name, path)
+        self.output = CappedOutput()
+        self.pokerbot = None
+        self.crashed = False  # failed to load, or raised while handling a packet
+
+    def build(self):
+        '''
+        In-process bots are plain Python and need no build step.
+        '''
+        pass
+
+    def run(self):
+        '''
+        Loads the pokerbot and connects it through a DirectChannel.
+        '''
+        try:
+            with redirect_stdout(self.output):
+                self.pokerbot, runner_module = load_bot(self.path)
+        except Exception:
+            self.output.write(traceback.format_exc())
+            print(self.name, 'failed to load in-process - check', self.path)
+            self.crashed = True
+            return
+        runner = runner_module.Runner(self.pokerbot, None)
+        if not hasattr(runner, 'process'):
+            runner = SkeletonDriver(self.pokerbot, runner_module)  # a stock skeleton only reads from a socket
+        self.socketfile = DirectChannel(runner, self.output)
+        self.reports_think_time = True
+        print(self.name, 'loaded in-process')
+
+    def stop(self):
+        '''
+        Ends the game for the pokerbot and writes its output log.
+        '''
+        if self.socketfile is not None:
+            self.crashed = self.crashed or self.socketfile.closed
+            try:
+                self.socketfile.write('Q\n')
+                self.socketfile.flush()
+            except OSError:
+                pass
+            self.socketfile.close()
+            self.socketfile = None
+        self.bytes_queue.put(self.output.getvalue().encode()[:PLAYER_LOG_SIZE_LIMIT])
+        super().stop()
+
+
+class HeadlessGame(Game):
+    '''
+    A Game whose players are loaded in-process.
+    '''
+
+    def __init__(self, seats=None, seed=GAME_SEED, duplicate=DUPLICATE_DEALS, log_format=GAME_LOG_FORMAT, log_sample=GAME_LOG_SAMPLE,
+                 hand_history=HAND_HISTORY, timing_report=TIMING_REPORT, profile_dir=''):
+        '''
+        seats: optional [(name, path), (name, path)], defaults to the players in config.py.
+        seed: seed for the deals.
+        duplicate: replay every deal with seats swapped.
+        log_format, log_sample: game log output, see GameLog.
+        hand_history: also write the binary hand history.
+        timing_report: also write the players' response times.
+        profile_dir: directory the bots keep opponent profiles in, '' keeps matches independent.
+        '''
+        super().__init__(seed, duplicate, log_format, log_sample, hand_history, timing_report)
+        self.seats = seats or [(PLAYER_1_NAME, PLAYER_1_PATH), (PLAYER_2_NAME, PLAYER_2_PATH)]
+        self.profile_dir = profile_dir
+
+    def make_players(self):
+        os.environ[PROFILE_VARIABLE] = os.path.abspath(self.profile_dir) if self.profile_dir else ''
+        return [InProcessPlayer(name, path) for name, path in self.seats]
+
+
+if __name__ == '__main__':
+    HeadlessGame().run()
@@ -0,0 +1,159 @@
+'''
+Parallel tournament runner.
+
+Plays N in-process matches for every pairing of the given bot directories
+(a single directory plays itself) across a pool of worker processes. Each match
+runs in its own output directory with its own seed, and the final bankrolls are
+aggregated into a results table with 95% confidence intervals; matches in which
+a bot crashed or failed to load are listed separately instead. The seed fixes the
+deals and Python's random module, and is exported to the bots in POKERBOT_SEED;
+a match is only repeatable if the bots seed any other generators from it and
+do not size their work by the game clock (main/ does, so its results still vary a little).
+
+Usage: python3 tournament.py BOT_DIR [BOT_DIR ...] [--matches N] [--workers K] [--duplicate]
+'''
+from contextlib import redirect_stdout
+from itertools import combinations
+from multiprocessing import Pool
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+from config import *
+from simulator import HeadlessGame
+
+RESULTS_FILENAME = 'results.json'
+SEED_VARIABLE = 'POKERBOT_SEED'  # environment variable that hands the match seed to the bots
+
+
+def bot_names(paths):
+    '''
+    Names each bot after its directory, adding a suffix when directories share a name.
+    '''
+    names = [os.path.basename(os.path.normpath(path)) for path in paths]
+    return [name if names.count(name) == 1 else '{}_{}'.format(name, i) for i, name in enumerate(names)]
+
+
+def schedule(paths, matches, seed, out_dir, duplicate=False, log_format=GAME_LOG_FORMAT, log_sample=GAME_LOG_SAMPLE,
+             hand_history=HAND_HISTORY, profile_dir=''):
+    '''
+    Lists one job per match: (match_id, seats, seed, game options, match output directory).
+    Match k of every pairing uses the same seed, so all pairings see the same deals.
+    Opponent profiles are off unless profile_dir names a directory shared by every match.
+    '''
+    paths = [os.path.abspath(path) for path in paths]
+    if len(paths) == 1:
+        paths = paths * 2
+    names = bot_names(paths)
+    seeder = random.Random(seed)
+    seeds = [seeder.getrandbits(32) for match in range(matches)]
+    jobs = []
+    for i, j in combinations(range(len(paths)), 2):
+        for match in range(matches):
+            seats = [(names[i], paths[i]), (names[j], paths[j])]
+            if match % 2 == 1:  # alternate who starts in seat 0
+                seats = seats[::-1]
+            match_id = '{}_vs_{}_{:04d}'.format(names[i], names[j], match)
+            options = {'duplicate': duplicate, 'log_format': log_format, 'log_sample': log_sample, 'hand_history': hand_history,
+                       'profile_dir': os.path.abspath(profile_dir) if profile_dir else ''}
+            jobs.append((match_id, seats, seeds[match], options, os.path.join(os.path.abspath(out_dir), match_id)))
+    return jobs
+
+
+def run_match(job):
+    '''
+    Plays one match in its own directory and returns its result record.
+    '''
+    match_id, seats, seed, options, match_dir = job
+    os.makedirs(match_dir, exist_ok=True)
+    os.chdir(match_dir)
+    random.seed(seed)  # makes bots that use random repeatable too
+    os.environ[SEED_VARIABLE] = str(seed)  # bots that seed their own generators from it, like main/
+    start_time = time.perf_counter()
+    with open('engine_output.txt', 'w') as engine_output, redirect_stdout(engine_output):
+        players = HeadlessGame(seats, seed, **options).run()
+    return {
+        'match': match_id,
+        'seed': seed,
+        'bankrolls': {player.name: player.bankroll for player in players},
+        'clocks': {player.name: player.game_clock for player in players},
+        'crashed': {player.name: player.crashed for player in players},
+        'seconds': time.perf_counter() - start_time,
+    }
+
+
+def summarize(results):
+    '''
+    Aggregates match results per pairing into rows of
+    (bot, opponent, matches, mean bankroll, 95% confidence half-width).
+    Matches in which a bot crashed are left out, see crashed_matches.
+    '''
+    pairings = {}
+    for result in results:
+        if any(result['crashed'].values()):
+            continue
+        first, second = sorted(result['bankrolls'])
+        pairings.setdefault((first, second), []).append(result['bankrolls'][first])
+    rows = []
+    for (first, second), bankrolls in sorted(pairings.items()):
+        n = len(bankrolls)
+        mean = sum(bankrolls) / n
+        variance = sum((x - mean) ** 2 for x in bankrolls) / (n - 1) if n > 1 else 0.
+        rows.append((first, second, n, mean, 1.96 * math.sqrt(variance / n)))
+    return rows
+
+
+def crashed_matches(results):
+    '''
+    Returns (match id, names of the bots that crashed or failed to load) for every match that had one.
+    '''
+    return [(result['match'], sorted(name for name, crashed in result['crashed'].items() if crashed))
+            for result in results if any(result['crashed'].values())]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 tournament.py')
+    parser.add_argument('bots', nargs='+', help='Bot directories, each containing player.py')
+    parser.add_argument('--matches', type=int, default=10, help='Matches per pairing')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the per-match seeds')
+    parser.add_argument('--out', type=str, default='tournament_output', help='Output directory')
+    parser.add_argument('--duplicate', action='store_true', help='Replay every deal with seats swapped')
+    parser.add_argument('--log-format', type=str, default=GAME_LOG_FORMAT, choices=['text', 'gzip', 'none'], help='Game log output')
+    parser.add_argument('--log-sample', type=int, default=GAME_LOG_SAMPLE, help='Only log every n-th round')
+    parser.add_argument('--hand-history', action='store_true', default=HAND_HISTORY, help='Write binary hand histories')
+    parser.add_argument('--profiles', type=str, default='', help='Directory for the bots\' opponent profiles, off by default')
+    args = parser.parse_args()
+
+    log_format = None if args.log_format == 'none' else args.log_format
+    jobs = schedule(args.bots, args.matches, args.seed, args.out, args.duplicate, log_format, args.log_sample,
+                    args.hand_history, args.profiles)
+    print('Running {} matches of {} rounds on {} workers'.format(len(jobs), NUM_ROUNDS, args.workers))
+    results = []
+    with Pool(args.workers) as pool:
+        for result in pool.imap_unordered(run_match, jobs):
+            results.append(result)
+            crashed = [name for name, crashed in result['crashed'].items() if crashed]
+            print('{} {} ({:.1f}s){}'.format(result['match'], result['bankrolls'], result['seconds'],
+                                             ' crashed: ' + ', '.join(crashed) if crashed else ''))
+    results.sort(key=lambda result: result['match'])
+    with open(os.path.join(args.out, RESULTS_FILENAME), 'w') as results_file:
+        json.dump(results, results_file, indent=1)
+
+    print()
+    print('{:<16} {:<16} {:>7} {:>12} {:>10}'.format('bot', 'opponent', 'matches', 'bankroll', '95% ci'))
+    for first, second, n, mean, ci in summarize(results):
+        print('{:<16} {:<16} {:>7} {:>12.1f} {:>10.1f}'.format(first, second, n, mean, ci))
+    crashed = crashed_matches(results)
+    if crashed:
+        print()
+        print('{} matches left out because a bot crashed, see its log in the match directory:'.format(len(crashed)))
+        for match_id, names in crashed:
+            print('{} {}'.format(match_id, ', '.join(names)))
+
+
+if __name__ == '__main__':
+    main()